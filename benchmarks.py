@@ -0,0 +1,322 @@
+"""Before/after benchmarks for the COVID-19 analysis helpers
+
+Run with: python benchmarks.py [owid-covid-data.csv]
+"""
+import multiprocessing as mp
+import resource
+import sys
+import time
+
+import pandas as pd
+
+
+def _run_measured(queue, func, args, kwargs):
+    """Child process body: run func and report wall time and peak RSS"""
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is reported in KiB on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((elapsed, peak_rss_mb))
+
+
+def measure(func, *args, **kwargs):
+    """Run func in a fresh process and return (wall seconds, peak RSS MB)"""
+    ctx = mp.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_measured, args=(queue, func, args, kwargs))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def print_results(title, rows):
+    """Print benchmark rows as a small table"""
+    print(f"\n{title}")
+    print(pd.DataFrame(rows).to_string(index=False))
+
+# Loader benchmark
+
+
+def bench_load_owid(file_path='owid-covid-data.csv'):
+    """Compare the default loader against the schema-pinned fast loader"""
+    from covid_analysis_utils import load_and_preprocess_data, SOCIO_ANALYSIS_COLUMNS
+
+    variants = {
+        'default': {'cache': False},
+        'fast': {'fast': True, 'cache': False},
+        'fast + pyarrow': {'fast': True, 'engine': 'pyarrow', 'cache': False},
+        'fast + pyarrow + usecols': {'fast': True, 'engine': 'pyarrow', 'cache': False,
+                                     'usecols': SOCIO_ANALYSIS_COLUMNS},
+    }
+
+    rows = []
+    for name, kwargs in variants.items():
+        elapsed, peak_rss = measure(load_and_preprocess_data, file_path, **kwargs)
+        rows.append({'variant': name, 'wall_s': round(elapsed, 2),
+                     'peak_rss_mb': round(peak_rss, 1)})
+    print_results('load_and_preprocess_data', rows)
+    return rows
+
+
+def bench_owid_cache(file_path='owid-covid-data.csv'):
+    """Compare CSV parsing against cold and warm Parquet snapshot reads"""
+    import shutil
+    import tempfile
+    from covid_analysis_utils import load_and_preprocess_data, SOCIO_ANALYSIS_COLUMNS
+
+    cache_dir = tempfile.mkdtemp(prefix='owid_cache_')
+    try:
+        rows = []
+        for name, kwargs in [
+            ('no cache', {'cache': False}),
+            ('cold cache', {}),
+            ('warm cache', {}),
+            ('warm cache + usecols', {'usecols': SOCIO_ANALYSIS_COLUMNS}),
+        ]:
+            elapsed, peak_rss = measure(load_and_preprocess_data, file_path, fast=True,
+                                        cache_dir=cache_dir, **kwargs)
+            rows.append({'variant': name, 'wall_s': round(elapsed, 2),
+                         'peak_rss_mb': round(peak_rss, 1)})
+        print_results('OWID Parquet snapshot cache', rows)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return rows
+
+
+# Cleaning benchmark
+
+
+def _clean_in_memory(file_path):
+    from covid_analysis_utils import clean_data, read_owid_csv
+    clean_data(read_owid_csv(file_path, cache=False))
+
+
+def bench_clean_chunked(file_path='owid-covid-data.csv'):
+    """Compare in-memory clean_data against the chunked cleaner"""
+    import os
+    import tempfile
+    from covid_analysis_utils import clean_data_chunked
+
+    output_path = os.path.join(tempfile.mkdtemp(prefix='owid_clean_'), 'clean.parquet')
+    rows = []
+    for name, func, args in [
+        ('clean_data', _clean_in_memory, (file_path,)),
+        ('clean_data_chunked', clean_data_chunked, (file_path, output_path)),
+    ]:
+        elapsed, peak_rss = measure(func, *args)
+        rows.append({'variant': name, 'wall_s': round(elapsed, 2),
+                     'peak_rss_mb': round(peak_rss, 1)})
+    os.remove(output_path)
+    print_results('Cleaning', rows)
+    return rows
+
+
+# Date summary benchmark
+
+
+def _summarize_per_country(df, freq):
+    from covid_analysis_utils import summarize_by_date
+    return [summarize_by_date(group.drop(columns='location'), freq=freq)
+            for _, group in df.groupby('location', observed=True)]
+
+
+def bench_summarize_by_date(file_path='owid-covid-data.csv'):
+    """Compare per-country summarize_by_date loops with the grouped summarizer"""
+    from covid_analysis_utils import read_owid_csv, summarize_by_date_grouped
+
+    df = read_owid_csv(file_path, fast=True)
+    rows = []
+    for freq in ['W', 'M']:
+        for name, func in [('summarize_by_date per country', _summarize_per_country),
+                           ('summarize_by_date_grouped', summarize_by_date_grouped)]:
+            start = time.perf_counter()
+            func(df, freq=freq)
+            rows.append({'variant': name, 'freq': freq,
+                         'wall_s': round(time.perf_counter() - start, 2)})
+    print_results('Daily -> weekly/monthly rollups', rows)
+    return rows
+
+
+# World Bank benchmark
+
+
+def bench_worldbank_sources(data_dir='worldbank', repeats=5):
+    """Compare cold-start World Bank loads from the extracted CSVs and the .zip archives"""
+    from process_worldbank_data import load_worldbank_data
+
+    rows = []
+    for source in ['csv', 'zip']:
+        timings = [measure(load_worldbank_data, data_dir=data_dir, cache=False, source=source)[0]
+                   for _ in range(repeats)]
+        rows.append({'source': source, 'best_ms': round(min(timings) * 1000, 1),
+                     'median_ms': round(sorted(timings)[len(timings) // 2] * 1000, 1)})
+    print_results('load_worldbank_data cold start (no snapshot)', rows)
+    return rows
+
+
+# Time-series rendering benchmark
+
+
+def bench_time_series_decimation(file_path='owid-covid-data.csv', y_col='new_cases_smoothed_per_million',
+                                 max_points=300):
+    """Compare full and decimated plot_multi_time_series over every OWID location"""
+    import io
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from covid_analysis_utils import plot_multi_time_series, read_owid_csv
+
+    df = read_owid_csv(file_path, fast=True, usecols=['location', 'date', y_col])
+    df['date'] = pd.to_datetime(df['date'])
+    rows = []
+    for name, kwargs in [('all points', {}),
+                         ('minmax auto', {'max_points': 'auto', 'method': 'minmax'}),
+                         (f'minmax {max_points}', {'max_points': max_points, 'method': 'minmax'}),
+                         (f'lttb {max_points}', {'max_points': max_points, 'method': 'lttb'})]:
+        start = time.perf_counter()
+        plot_multi_time_series(df, 'date', y_col, 'location', 'All locations', 'Date', y_col,
+                               legend=False, **kwargs)
+        fig = plt.gcf()
+        n_vertices = sum(len(line.get_xdata()) for line in fig.axes[0].get_lines())
+        fig.canvas.draw()
+        draw_s = time.perf_counter() - start
+        svg = io.BytesIO()
+        fig.savefig(svg, format='svg')
+        plt.close(fig)
+        rows.append({'variant': name, 'vertices': n_vertices, 'plot+draw_s': round(draw_s, 2),
+                     'total_s': round(time.perf_counter() - start, 2),
+                     'svg_mb': round(svg.tell() / 1e6, 1)})
+    print_results(f'plot_multi_time_series ({df["location"].nunique()} locations, {len(df)} rows)', rows)
+    return rows
+
+
+# Bootstrap benchmark
+
+
+def _synthetic_countries(n_countries=190, seed=0):
+    """Country-level frame shaped like the socioeconomic summaries"""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'gdp_group': rng.choice(['Low Income', 'Middle Income', 'High Income'], n_countries),
+        'efficiency_ratio': rng.gamma(2.0, 30.0, n_countries),
+        'stringency_index': rng.uniform(20, 80, n_countries),
+        'total_deaths_per_million': rng.gamma(2.0, 1500.0, n_countries),
+    })
+
+
+def _bootstrap_pandas_loop(df, n_boot):
+    for seed in range(n_boot):
+        df.sample(frac=1, replace=True, random_state=seed).groupby('gdp_group').agg(
+            {'efficiency_ratio': ['mean', 'median']})
+
+
+def bench_bootstrap(n_boot=10_000):
+    """Replicates per second of the vectorized bootstrap vs a pandas resample/groupby loop"""
+    from covid_analysis_stats import bootstrap_correlation, bootstrap_groupby
+
+    df = _synthetic_countries()
+    aggs = {'efficiency_ratio': ['mean', 'median']}
+    pairs = [('stringency_index', 'total_deaths_per_million')]
+    loop_reps = 200
+    rows = []
+    for name, reps, func in [
+        ('pandas sample+groupby loop', loop_reps, lambda: _bootstrap_pandas_loop(df, loop_reps)),
+        ('bootstrap_groupby, 1 process', n_boot,
+         lambda: bootstrap_groupby(df, 'gdp_group', aggs, n_boot, max_workers=1)),
+        ('bootstrap_groupby, pool', n_boot, lambda: bootstrap_groupby(df, 'gdp_group', aggs, n_boot, max_workers=None)),
+        ('bootstrap_correlation, 1 process', n_boot,
+         lambda: bootstrap_correlation(df, pairs, n_boot=n_boot, max_workers=1)),
+        ('bootstrap_correlation, pool', n_boot, lambda: bootstrap_correlation(df, pairs, n_boot=n_boot, max_workers=None)),
+    ]:
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        rows.append({'variant': name, 'replicates': reps, 'wall_s': round(elapsed, 2),
+                     'replicates_per_s': round(reps / elapsed)})
+    print_results(f'Bootstrap ({len(df)} countries, mean + median by 3 groups / one correlation)', rows)
+    return rows
+
+
+# Permutation test benchmark
+
+
+def _permutation_pandas_loop(df, n_perm):
+    import numpy as np
+    rng = np.random.default_rng(0)
+    shuffled = df.copy()
+    for _ in range(n_perm):
+        shuffled['gdp_group'] = rng.permutation(df['gdp_group'].to_numpy())
+        shuffled.groupby('gdp_group')['efficiency_ratio'].agg(['sum', 'count'])
+
+
+def bench_permutation_test(n_perm=100_000):
+    """Permutations per second of permutation_test vs a shuffle + groupby loop"""
+    from covid_analysis_stats import permutation_test
+
+    df = _synthetic_countries()
+    loop_perms = 500
+    rows = []
+    for name, perms, func in [
+        ('pandas shuffle+groupby loop', loop_perms, lambda: _permutation_pandas_loop(df, loop_perms)),
+        ('permutation_test anova, 1 process', n_perm,
+         lambda: permutation_test(df, 'gdp_group', 'efficiency_ratio', n_perm=n_perm, max_workers=1)),
+        ('permutation_test anova, pool', n_perm,
+         lambda: permutation_test(df, 'gdp_group', 'efficiency_ratio', n_perm=n_perm, max_workers=None)),
+        ('permutation_test diff_means, pool', n_perm,
+         lambda: permutation_test(df, 'gdp_group', 'efficiency_ratio', 'diff_means',
+                                  groups=['High Income', 'Low Income'], n_perm=n_perm, max_workers=None)),
+    ]:
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        rows.append({'variant': name, 'permutations': perms, 'wall_s': round(elapsed, 2),
+                     'permutations_per_s': round(perms / elapsed)})
+    print_results(f'Permutation tests ({len(df)} countries, 3 groups)', rows)
+    return rows
+
+
+# Batch OLS benchmark
+
+
+def _ols_statsmodels_loop(df, y_col, x_cols, group_col):
+    import statsmodels.api as sm
+    for _, group in df.groupby(group_col, observed=True):
+        data = group[[y_col] + x_cols].dropna()
+        sm.OLS(data[y_col], sm.add_constant(data[x_cols])).fit().pvalues
+
+
+def bench_ols_batch(n_groups=300):
+    """Fit one 2-predictor regression per subgroup with statsmodels vs fit_ols_batch"""
+    from covid_analysis_stats import fit_ols_batch
+
+    df = pd.concat([_synthetic_countries(seed=seed).assign(group=seed) for seed in range(n_groups)],
+                   ignore_index=True)
+    y_col, x_cols = 'total_deaths_per_million', ['stringency_index', 'efficiency_ratio']
+    rows = []
+    for name, func in [
+        ('sm.OLS per group', lambda: _ols_statsmodels_loop(df, y_col, x_cols, 'group')),
+        ('fit_ols_batch', lambda: fit_ols_batch(df, {'m': (y_col, x_cols)}, group_col='group')),
+    ]:
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        rows.append({'variant': name, 'models': n_groups, 'wall_s': round(elapsed, 3),
+                     'models_per_s': round(n_groups / elapsed)})
+    print_results(f'OLS per subgroup ({n_groups} groups x {len(df) // n_groups} rows)', rows)
+    return rows
+
+
+if __name__ == '__main__':
+    owid_path = sys.argv[1] if len(sys.argv) > 1 else 'owid-covid-data.csv'
+    bench_load_owid(owid_path)
+    bench_owid_cache(owid_path)
+    bench_clean_chunked(owid_path)
+    bench_summarize_by_date(owid_path)
+    bench_worldbank_sources()
+    bench_time_series_decimation(owid_path)
+    bench_bootstrap()
+    bench_permutation_test()
+    bench_ols_batch()
@@ -24,21 +24,21 @@ from scipy import stats
 
 # import utils
 from covid_analysis_utils import *
+from covid_analysis_figures import *
+from covid_analysis_stats import *
 
 # setup fonts not used
 # setup_chinese_fonts()
 
 # setup plot style
-sns.set_style('whitegrid')
-plt.rcParams['figure.figsize'] = (12, 6)
-plt.rcParams['font.size'] = 12
+apply_report_style()
 
 
 # In[3]:
 
 
-# load data
-df = load_and_preprocess_data()
+# load data (same columns and dtypes as covid_analysis_pipeline)
+df = load_and_preprocess_data(**SOCIO_LOAD_KWARGS)
 print(f"size: {df.shape}")
 df.head()
 
@@ -85,17 +85,20 @@ plot_frequency_distribution(
 # In[8]:
 
 
+# Build all per-country aggregates in one grouped pass;
+# the sections below select the columns they need from it.
+# Aggregate locations (World, continents, income groups) were tagged at
+# load time and are skipped here
+country_summary = build_country_summary(df_clean, countries_only=True)
+
 # Filter countries with sufficient socioeconomic data
 # Focus on countries with GDP and life expectancy data
-country_socio_data = df_clean.groupby('location').agg({
-    'gdp_per_capita': 'count',
-    'life_expectancy': 'count'
-}).reset_index()
+country_socio_data = country_summary[['location', 'gdp_per_capita_count', 'life_expectancy_count']]
 
 # Filter countries that have both GDP and life expectancy data
 countries_with_socio_data = country_socio_data[
-    (country_socio_data['gdp_per_capita'] > 0) & 
-    (country_socio_data['life_expectancy'] > 0)
+    (country_socio_data['gdp_per_capita_count'] > 0) & 
+    (country_socio_data['life_expectancy_count'] > 0)
 ]['location'].tolist()
 
 print(f"Number of countries with socioeconomic data: {len(countries_with_socio_data)}")
@@ -104,6 +107,9 @@ print(f"Number of countries with socioeconomic data: {len(countries_with_socio_d
 socio_df = df_clean[df_clean['location'].isin(countries_with_socio_data)].copy()
 print(f"Size of filtered data: {socio_df.shape}")
 
+# Per-country aggregates for the filtered countries
+socio_summary = country_summary[country_summary['location'].isin(countries_with_socio_data)].reset_index(drop=True)
+
 
 # In[9]:
 
@@ -127,15 +133,9 @@ plot_frequency_distribution(
 # Analyze relationship between COVID-19 mortality rate and life expectancy
 
 # Calculate cumulative mortality rate (per million) for each country
-country_mortality = socio_df.groupby('location').agg({
-    'total_deaths_per_million': 'max',  # Use maximum value (latest cumulative)
-    'life_expectancy': 'first',  # Use first value (relatively constant)
-    'continent': 'first',  # Record continent
-    'gdp_per_capita': 'first'  # Record GDP per capita
-}).reset_index()
-
-# Remove rows with NaN mortality rate
-country_mortality = country_mortality.dropna(subset=['total_deaths_per_million', 'life_expectancy'])
+# (max deaths = latest cumulative, first life expectancy/continent/GDP per capita)
+# (countries with NaN mortality rate or life expectancy are dropped)
+country_mortality = build_country_mortality(socio_summary)
 
 # Group by continent to examine regional differences
 continent_mortality = country_mortality.groupby('continent').agg({
@@ -199,13 +199,12 @@ plt.tight_layout()
 
 
 # Calculate correlation between life expectancy and mortality rate
-corr, p_value = stats.pearsonr(country_mortality['life_expectancy'], country_mortality['total_deaths_per_million'])
+corr, p_value = correlation_test(country_mortality, 'life_expectancy', 'total_deaths_per_million')
 print(f"Correlation coefficient between life expectancy and COVID-19 mortality rate: {corr:.3f} (p={p_value:.3f})")
 
 # Perform simple linear regression
-X = sm.add_constant(country_mortality['life_expectancy'])
-model = sm.OLS(country_mortality['total_deaths_per_million'], X).fit()
-print(model.summary())
+mortality_fit, mortality_results = fit_ols_batch(country_mortality, MORTALITY_MODEL, full_results=True)
+print(mortality_results['deaths ~ life_expectancy'].summary())
 
 
 # In[15]:
@@ -237,47 +236,15 @@ print(continent_life_loss.sort_values('estimated_life_expectancy_loss', ascendin
 
 
 # Load World Bank GDP data
-def load_worldbank_data():
-    """Load and process World Bank GDP data"""
-    # Read GDP indicator data
-    gdp_growth = pd.read_csv('worldbank/API_NY.GDP.MKTP.KD.ZG_DS2_en_csv_v2_76269.csv', skiprows=4)
-    gdp_per_capita = pd.read_csv('worldbank/API_NY.GDP.PCAP.CD_DS2_en_csv_v2_76317.csv', skiprows=4)
-    gdp_per_capita_growth = pd.read_csv('worldbank/API_NY.GDP.PCAP.KD.ZG_DS2_en_csv_v2_76067.csv', skiprows=4)
-    gdp_current = pd.read_csv('worldbank/API_NY.GDP.MKTP.CD_DS2_en_csv_v2_76261.csv', skiprows=4)
-    
-    # Select required columns
-    columns = ['Country Code', 'Country Name', '2019', '2020', '2021', '2022']
-    
-    # Rename dataframes
-    gdp_growth = gdp_growth[columns].rename(columns={'2019': 'gdp_growth_2019', '2020': 'gdp_growth_2020', 
-                                                    '2021': 'gdp_growth_2021', '2022': 'gdp_growth_2022'})
-    gdp_per_capita = gdp_per_capita[columns].rename(columns={'2019': 'gdp_per_capita_2019', '2020': 'gdp_per_capita_2020',
-                                                            '2021': 'gdp_per_capita_2021', '2022': 'gdp_per_capita_2022'})
-    gdp_per_capita_growth = gdp_per_capita_growth[columns].rename(columns={'2019': 'gdp_per_capita_growth_2019',
-                                                                         '2020': 'gdp_per_capita_growth_2020',
-                                                                         '2021': 'gdp_per_capita_growth_2021',
-                                                                         '2022': 'gdp_per_capita_growth_2022'})
-    gdp_current = gdp_current[columns].rename(columns={'2019': 'gdp_current_2019', '2020': 'gdp_current_2020',
-                                                     '2021': 'gdp_current_2021', '2022': 'gdp_current_2022'})
-    
-    # Merge all data
-    gdp_data = pd.merge(gdp_growth, gdp_per_capita, on=['Country Code', 'Country Name'])
-    gdp_data = pd.merge(gdp_data, gdp_per_capita_growth, on=['Country Code', 'Country Name'])
-    gdp_data = pd.merge(gdp_data, gdp_current, on=['Country Code', 'Country Name'])
-    
-    # Calculate GDP changes (using GDP growth data instead of current GDP)
-    gdp_data['gdp_change_2020'] = gdp_data['gdp_growth_2020']
-    gdp_data['gdp_change_2021'] = gdp_data['gdp_growth_2021'] 
-    gdp_data['gdp_change_2022'] = gdp_data['gdp_growth_2022']
-    
-    return gdp_data
+# (all indicators are parsed once and cached, see process_worldbank_data)
+from process_worldbank_data import load_worldbank_data, build_country_index
 
 
 # In[17]:
 
 
-# load additional data: GDP data
-gdp_data = load_worldbank_data()
+# load additional data: GDP data (countries only, aggregates filtered via Metadata_Country)
+gdp_data = load_worldbank_data(countries_only=True)
 
 
 # In[18]:
@@ -289,12 +256,8 @@ gdp_data.head()
 # In[19]:
 
 
-country_impact = socio_df.groupby('location').agg({
-    'stringency_index': 'mean',
-    'total_deaths_per_million': 'max', 
-    'gdp_per_capita': 'first',
-    'continent': 'first'
-}).reset_index()
+country_impact = socio_summary[['location', 'stringency_index', 'total_deaths_per_million',
+                                'gdp_per_capita', 'continent']].copy()
 print(country_impact.shape)
 country_impact.head()
 
@@ -307,21 +270,12 @@ country_impact.head()
 
 # Calculate average stringency index and death rate for each country
 
-country_impact = pd.merge(
-    country_impact,
-    gdp_data,
-    left_on='location',
-    right_on='Country Name'
-)
-
-# Remove rows with missing values
-country_impact = country_impact.dropna(subset=['stringency_index', 'total_deaths_per_million', 'gdp_per_capita'])
-
-# Group countries into high/medium/low by GDP
-country_impact['gdp_group'] = pd.qcut(country_impact['gdp_per_capita'], 3, labels=['Low Income', 'Middle Income', 'High Income'])
-country_impact['income_level'] = pd.qcut(country_impact['gdp_per_capita'], 
-                                       q=4, 
-                                       labels=['Low', 'Medium-Low', 'Medium-High', 'High'])
+# Match OWID locations to World Bank countries through one integer country key
+# (by ISO code first, then by name), reporting anything left unmatched;
+# rows with missing values are removed and countries are grouped into
+# high/medium/low (gdp_group) and four income levels by GDP
+country_index = build_country_index(df_clean)
+country_impact = build_country_impact(socio_summary, gdp_data, country_index)
 
 
 # In[21]:
@@ -338,7 +292,7 @@ country_impact
 
 print("\nGDP Impact Analysis:")
 print("\n1. Correlation between Stringency Index and GDP Change:")
-corr, p_value = stats.pearsonr(country_impact['stringency_index'], country_impact['gdp_change_2020'])
+corr, p_value = correlation_test(country_impact, 'stringency_index', 'gdp_change_2020')
 print(f"Correlation: {corr:.3f} (p={p_value:.3f})")
 
 print("\n2. GDP Changes by Continent:")
@@ -354,91 +308,43 @@ print(continent_gdp)
 # In[23]:
 
 
-plt.figure(figsize=(10, 6))
-sns.scatterplot(data=country_impact, x='stringency_index', y='gdp_change_2020', hue='continent')
-plt.title('Stringency Index vs GDP Change (2020)')
-plt.xlabel('Average Stringency Index')
-plt.ylabel('GDP Change (%)')
-plt.legend(title='Continent')
-plt.tight_layout()
-plt.savefig('ca/images/gdp_stringency_relation.png')
+render_figure(plot_gdp_stringency_relation, country_impact, 'gdp_stringency_relation.png')
 
 
 # In[24]:
 
 
-plt.figure(figsize=(10, 6))
-sns.boxplot(data=country_impact, x='continent', y='gdp_change_2020')
-plt.title('GDP Change Distribution by Continent (2020)')
-plt.xlabel('Continent')
-plt.ylabel('GDP Change (%)')
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig('ca/images/gdp_continent_boxplot.png')
+render_figure(plot_gdp_continent_boxplot, country_impact, 'gdp_continent_boxplot.png')
 
 
 # In[25]:
 
 
-plt.figure(figsize=(12, 6))
-continent_trend = country_impact.groupby('continent')[['gdp_change_2020', 'gdp_change_2021', 'gdp_change_2022']].mean()
-continent_trend.plot(kind='bar')
-plt.title('GDP Change Trend by Continent')
-plt.xlabel('Continent')
-plt.ylabel('GDP Change (%)')
-plt.legend(title='Year')
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig('ca/images/gdp_trend_by_continent.png')
+continent_trend = continent_gdp_trend(country_impact)
+render_figure(plot_gdp_trend_by_continent, continent_trend, 'gdp_trend_by_continent.png')
 
 
 # In[26]:
 
 
-plt.figure(figsize=(10, 6))
-sns.scatterplot(data=country_impact, x='gdp_per_capita_2019', y='gdp_change_2020', hue='continent')
-plt.title('GDP per Capita vs GDP Change (2020)')
-plt.xlabel('GDP per Capita (2019)')
-plt.ylabel('GDP Change (%)')
-plt.legend(title='Continent')
-plt.tight_layout()
-plt.savefig('ca/images/gdp_per_capita_relation.png')
+render_figure(plot_gdp_per_capita_relation, country_impact, 'gdp_per_capita_relation.png')
 
 
 # In[27]:
 
 
-plt.figure(figsize=(10, 6))
-sns.boxplot(data=country_impact, x='income_level', y='gdp_change_2020')
-plt.title('GDP Change by Income Level (2020)')
-plt.xlabel('Income Level')
-plt.ylabel('GDP Change (%)')
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig('ca/images/gdp_income_level.png')
+render_figure(plot_gdp_income_level, country_impact, 'gdp_income_level.png')
 
 
 # In[28]:
 
 
-plt.figure(figsize=(12, 6))
+# Fit stringency -> GDP change per income level once; the slopes are reused in the text
+income_fits = regression_lines(country_impact, 'stringency_index', 'gdp_change_2020', 'income_level')
+income_slopes = income_fits['coefficients'].query("term == 'stringency_index'")
+print(income_slopes[['income_level', 'coef', 'ci_low', 'ci_high', 'p_value', 'n_obs']].round(3))
 
-# Plot scatter points
-sns.scatterplot(data=country_impact, x='stringency_index', y='gdp_change_2020', 
-                hue='income_level', alpha=0.5)
-
-# Add regression lines for each income level
-for income in country_impact['income_level'].unique():
-    income_data = country_impact[country_impact['income_level'] == income]
-    sns.regplot(data=income_data, x='stringency_index', y='gdp_change_2020',
-                scatter=False, label=f'{income} (trend)')
-
-plt.title('Stringency Index vs GDP Change by Income Level with Trend Lines (2020)')
-plt.xlabel('Average Stringency Index')
-plt.ylabel('GDP Change (%)')
-plt.legend(title='Income Level')
-plt.tight_layout()
-plt.savefig('ca/images/gdp_stringency_income.png')
+render_figure(plot_gdp_stringency_income, country_impact, 'gdp_stringency_income.png', fits=income_fits)
 
 
 # In[29]:
@@ -474,9 +380,8 @@ print(continent_impact)
 # Compare stringency-mortality efficiency across GDP groups
 # Calculate efficiency ratio for each country: mortality rate / stringency index
 # Lower ratio indicates lower mortality per unit of stringency, i.e. higher policy efficiency
-# Filter out data with stringency index of 0 to avoid division by zero
-country_impact_filtered = country_impact[country_impact['stringency_index'] > 0]
-country_impact_filtered['efficiency_ratio'] = country_impact_filtered['total_deaths_per_million'] / country_impact_filtered['stringency_index']
+# (build_country_impact leaves it NaN where the stringency index is 0; those countries are filtered out)
+country_impact_filtered = country_impact.dropna(subset=['efficiency_ratio'])
 
 # Calculate average efficiency ratios by GDP group
 gdp_efficiency = country_impact_filtered.groupby('gdp_group').agg({
@@ -487,19 +392,24 @@ gdp_efficiency = country_impact_filtered.groupby('gdp_group').agg({
 print("Policy efficiency by income level:")
 print(gdp_efficiency)
 
+# 95% bootstrap intervals (10k resamples of countries)
+gdp_efficiency_ci = bootstrap_groupby(country_impact_filtered, 'gdp_group',
+                                      {'efficiency_ratio': ['mean', 'median']}, max_workers=1)
+print("\nBootstrap 95% CI of efficiency ratio by income level:")
+print(gdp_efficiency_ci.round(2))
+
+# Permutation test: does the efficiency ratio differ across income levels?
+efficiency_test = permutation_test(country_impact_filtered, 'gdp_group', 'efficiency_ratio',
+                                   max_workers=1)
+print(f"\nPermutation ANOVA (efficiency ratio ~ income level): "
+      f"F={efficiency_test['statistic']:.2f}, p={efficiency_test['p_value']:.4f}")
+
 
 # In[31]:
 
 
 # Create boxplot: efficiency ratio by GDP group
-plt.figure(figsize=(12, 7))
-sns.boxplot(x='gdp_group', y='efficiency_ratio', data=country_impact_filtered, palette='viridis')
-plt.xlabel('Income Level Group')
-plt.ylabel('Efficiency Ratio (Deaths/Stringency)')
-plt.title('Policy Efficiency Comparison Across Income Levels')
-plt.grid(True, alpha=0.3, axis='y')
-plt.tight_layout()
-plt.savefig('ca/images/efficiency-gdp.png')
+render_figure(plot_efficiency_gdp, country_impact_filtered, 'efficiency-gdp.png')
 
 
 # ## 5. Low income countries disproportionate impact
@@ -513,16 +423,8 @@ poverty_data_count = socio_df['extreme_poverty'].notnull().sum()
 print(f"Extreme poverty data availability: {poverty_data_count} rows ({poverty_data_count/len(socio_df)*100:.2f}%)")
 
 # Calculate extreme poverty rate and COVID-19 impact for each country
-country_poverty = socio_df.groupby('location').agg({
-    'extreme_poverty': 'first',
-    'total_deaths_per_million': 'max',
-    'gdp_per_capita': 'first',
-    'continent': 'first',
-    'stringency_index': 'mean'
-}).reset_index()
-
-# Remove rows with NaN extreme poverty rate
-country_poverty = country_poverty.dropna(subset=['extreme_poverty', 'total_deaths_per_million'])
+# (rows with NaN extreme poverty rate are removed)
+country_poverty = build_country_poverty(socio_summary)
 print(f"Number of countries with extreme poverty data: {len(country_poverty)}")
 
 
@@ -530,77 +432,35 @@ print(f"Number of countries with extreme poverty data: {len(country_poverty)}")
 
 
 # Create scatter plot: Extreme poverty rate vs COVID-19 deaths
-plt.figure(figsize=(12, 8))
-
-# Create scatter plot
-plt.scatter(country_poverty['extreme_poverty'], 
-            country_poverty['total_deaths_per_million'],
-            alpha=0.7, s=50, c=country_poverty['gdp_per_capita'], cmap='viridis')
-
-# Add colorbar
-plt.colorbar(label='GDP per capita (USD)')
-
-# Label selected countries
-# for i, row in country_poverty.iterrows():
-#     if row['extreme_poverty'] > 40 or row['total_deaths_per_million'] > 5000:
-#         plt.annotate(row['location'], 
-#                      xy=(row['extreme_poverty'], row['total_deaths_per_million']),
-#                      xytext=(5, 0), textcoords='offset points')
-
-plt.xlabel('Extreme Poverty Rate (%)')
-plt.ylabel('COVID-19 Deaths per Million')
-plt.title('Relationship between Extreme Poverty and COVID-19 Mortality')
-plt.grid(True, alpha=0.3)
-plt.tight_layout()
-plt.savefig('ca/images/proverty-death.png')
+render_figure(plot_poverty_death, country_poverty, 'proverty-death.png')
 
 
 # In[34]:
 
 
 # Calculate correlation between extreme poverty rate and mortality rate
-corr, p_value = stats.pearsonr(country_poverty['extreme_poverty'], country_poverty['total_deaths_per_million'])
+corr, p_value = correlation_test(country_poverty, 'extreme_poverty', 'total_deaths_per_million')
 print(f"Correlation coefficient between extreme poverty rate and COVID-19 mortality rate: {corr:.3f} (p={p_value:.3f})")
 
 # Plot regression line
-plt.figure(figsize=(12, 8))
-sns.regplot(x='extreme_poverty', y='total_deaths_per_million', data=country_poverty, scatter_kws={'alpha':0.7})
-plt.xlabel('Extreme Poverty Rate (%)')
-plt.ylabel('COVID-19 Deaths per Million')
-plt.title('Correlation between Extreme Poverty and COVID-19 Mortality Rate')
-plt.grid(True, alpha=0.3)
-plt.tight_layout()
-plt.savefig('ca/images/poverty_mortality_correlation.png')
+render_figure(plot_poverty_mortality_correlation, country_poverty, 'poverty_mortality_correlation.png')
 
 
 # In[35]:
 
 
 # Multiple regression analysis: Impact of GDP, extreme poverty and stringency on mortality rate
-# First remove rows with missing values
-country_poverty_clean = country_poverty.dropna(subset=['gdp_per_capita', 'extreme_poverty', 'stringency_index', 'total_deaths_per_million'])
-
-X = country_poverty_clean[['gdp_per_capita', 'extreme_poverty', 'stringency_index']]
-X = sm.add_constant(X)  # Add constant term
-y = country_poverty_clean['total_deaths_per_million']
-
-# Fit model
-model = sm.OLS(y, X).fit()
-print(model.summary())
+# (rows with missing values are removed; a constant term is added)
+poverty_fit, poverty_results = fit_ols_batch(country_poverty, POVERTY_MODEL, full_results=True)
+print(poverty_results['deaths ~ gdp + poverty + stringency'].summary())
 
 
 # In[36]:
 
 
 # Analyze extreme poverty and COVID-19 impact by income level
-# Group countries by GDP
-country_poverty['gdp_group'] = pd.qcut(country_poverty['gdp_per_capita'], 3, labels=['Low Income', 'Middle Income', 'High Income'])
-
-# Analyze by GDP group and poverty level
-# Split extreme poverty rate into three groups: low (<5%), medium (5-20%), high (>20%)
-country_poverty['poverty_group'] = pd.cut(country_poverty['extreme_poverty'],
-                                        bins=[0, 5, 20, 100],
-                                        labels=['Low Poverty', 'Medium Poverty', 'High Poverty'])
+# Analyze by GDP group (tertiles) and poverty level: low (<5%), medium (5-20%), high (>20%)
+# (both groupings are added by build_country_poverty)
 
 # Calculate average mortality rate for each GDP and poverty combination
 poverty_gdp_impact = country_poverty.groupby(['gdp_group', 'poverty_group']).agg({
@@ -611,24 +471,26 @@ poverty_gdp_impact = country_poverty.groupby(['gdp_group', 'poverty_group']).agg
 print("COVID-19 mortality rates by income and poverty level:")
 print(poverty_gdp_impact)
 
+# Permutation tests: do deaths differ across poverty levels?
+poverty_test = permutation_test(country_poverty, 'poverty_group', 'total_deaths_per_million',
+                                max_workers=1)
+print(f"\nPermutation ANOVA (deaths ~ poverty level): "
+      f"F={poverty_test['statistic']:.2f}, p={poverty_test['p_value']:.4f}")
+poverty_diff_test = permutation_test(country_poverty, 'poverty_group', 'total_deaths_per_million',
+                                     statistic='diff_means', groups=['High Poverty', 'Low Poverty'],
+                                     max_workers=1)
+print(f"High vs low poverty difference in deaths per million: "
+      f"{poverty_diff_test['statistic']:.1f}, p={poverty_diff_test['p_value']:.4f}")
+
 
 # In[44]:
 
 
 # Create heatmap: GDP groups x Poverty groups vs Mortality rate
 # Reshape data into format suitable for heatmap
-heatmap_data = poverty_gdp_impact.pivot_table(
-    index='gdp_group', 
-    columns='poverty_group', 
-    values=['total_deaths_per_million'],
-    aggfunc='mean'
-)
-
-plt.figure(figsize=(10, 8))
-sns.heatmap(heatmap_data, annot=True, fmt='.0f', cmap='YlOrRd')
-plt.title('COVID-19 Mortality Rate by Income and Poverty Level')
-plt.tight_layout()
-plt.savefig("ca/images/proverty-death-heatmap.png")
+heatmap_data = poverty_heatmap_data(country_poverty)
+
+render_figure(plot_poverty_death_heatmap, heatmap_data, 'proverty-death-heatmap.png')
 
 
 # # 6. Conclusions and Findings
@@ -0,0 +1,306 @@
+"""Report figures for the socioeconomic analysis (ca/images)
+
+Each function draws one figure from an already-computed, country-level
+frame and saves it when a path is given. render_figures() draws a batch
+of them in parallel and skips figures whose inputs have not changed;
+render_figure() does the same for a single figure, in-process.
+"""
+import hashlib
+import inspect
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib.pyplot as plt
+import pandas as pd
+import seaborn as sns
+
+from covid_analysis_stats import regression_lines
+from covid_analysis_utils import code_sources, content_hash
+
+FIGURE_DIR = 'ca/images'
+FIGURE_REPORT_COLUMNS = ['figure', 'path', 'status', 'seconds', 'error']
+
+# PNG text chunk holding the fingerprint of a figure's inputs
+FINGERPRINT_KEY = 'Fingerprint'
+
+# Seaborn style and rcParams every report figure is drawn with
+REPORT_STYLE = 'whitegrid'
+REPORT_RC = {'figure.figsize': (12, 6), 'font.size': 12}
+
+
+def apply_report_style():
+    """Apply the report's seaborn style and rcParams to the current process"""
+    sns.set_style(REPORT_STYLE)
+    plt.rcParams.update(REPORT_RC)
+
+
+def _finish(path):
+    """Lay out the current figure and save it if a path is given"""
+    plt.tight_layout()
+    if path is not None:
+        plt.savefig(path)
+    return plt.gcf()
+
+# Health impact vs economic impact
+
+
+def plot_gdp_stringency_relation(country_impact, path=None):
+    """Stringency index vs GDP change (2020), coloured by continent"""
+    plt.figure(figsize=(10, 6))
+    sns.scatterplot(data=country_impact, x='stringency_index', y='gdp_change_2020', hue='continent')
+    plt.title('Stringency Index vs GDP Change (2020)')
+    plt.xlabel('Average Stringency Index')
+    plt.ylabel('GDP Change (%)')
+    plt.legend(title='Continent')
+    return _finish(path)
+
+
+def plot_gdp_continent_boxplot(country_impact, path=None):
+    """GDP change distribution by continent (2020)"""
+    plt.figure(figsize=(10, 6))
+    sns.boxplot(data=country_impact, x='continent', y='gdp_change_2020')
+    plt.title('GDP Change Distribution by Continent (2020)')
+    plt.xlabel('Continent')
+    plt.ylabel('GDP Change (%)')
+    plt.xticks(rotation=45)
+    return _finish(path)
+
+
+def plot_gdp_trend_by_continent(continent_trend, path=None):
+    """Mean GDP change per year by continent (continent x year frame)"""
+    plt.figure(figsize=(12, 6))
+    continent_trend.plot(kind='bar')
+    plt.title('GDP Change Trend by Continent')
+    plt.xlabel('Continent')
+    plt.ylabel('GDP Change (%)')
+    plt.legend(title='Year')
+    plt.xticks(rotation=45)
+    return _finish(path)
+
+
+def plot_gdp_per_capita_relation(country_impact, path=None):
+    """GDP per capita (2019) vs GDP change (2020), coloured by continent"""
+    plt.figure(figsize=(10, 6))
+    sns.scatterplot(data=country_impact, x='gdp_per_capita_2019', y='gdp_change_2020', hue='continent')
+    plt.title('GDP per Capita vs GDP Change (2020)')
+    plt.xlabel('GDP per Capita (2019)')
+    plt.ylabel('GDP Change (%)')
+    plt.legend(title='Continent')
+    return _finish(path)
+
+
+def plot_gdp_income_level(country_impact, path=None):
+    """GDP change by income level (2020)"""
+    plt.figure(figsize=(10, 6))
+    sns.boxplot(data=country_impact, x='income_level', y='gdp_change_2020')
+    plt.title('GDP Change by Income Level (2020)')
+    plt.xlabel('Income Level')
+    plt.ylabel('GDP Change (%)')
+    plt.xticks(rotation=45)
+    return _finish(path)
+
+
+def plot_gdp_stringency_income(country_impact, path=None, fits=None):
+    """Stringency index vs GDP change with a trend line and 95% CI band per income level"""
+    if fits is None:
+        fits = regression_lines(country_impact, 'stringency_index', 'gdp_change_2020', 'income_level')
+
+    plt.figure(figsize=(12, 6))
+
+    # Plot scatter points
+    sns.scatterplot(data=country_impact, x='stringency_index', y='gdp_change_2020',
+                    hue='income_level', alpha=0.5)
+
+    # Draw the precomputed regression line and confidence band for each income level,
+    # coloured by the level's position in the categories (as the scatter hue is)
+    categories = country_impact['income_level'].cat.categories
+    colors = dict(zip(categories, sns.color_palette(n_colors=len(categories))))
+    for income, line in fits['lines'].groupby('income_level', observed=True):
+        color = colors[income]
+        plt.plot(line['x'], line['fit'], color=color, label=f'{income} (trend)')
+        plt.fill_between(line['x'], line['ci_low'], line['ci_high'], color=color, alpha=0.15)
+
+    plt.title('Stringency Index vs GDP Change by Income Level with Trend Lines (2020)')
+    plt.xlabel('Average Stringency Index')
+    plt.ylabel('GDP Change (%)')
+    plt.legend(title='Income Level')
+    return _finish(path)
+
+
+def plot_efficiency_gdp(country_impact_filtered, path=None):
+    """Efficiency ratio (deaths / stringency) by GDP group"""
+    plt.figure(figsize=(12, 7))
+    sns.boxplot(x='gdp_group', y='efficiency_ratio', data=country_impact_filtered, palette='viridis')
+    plt.xlabel('Income Level Group')
+    plt.ylabel('Efficiency Ratio (Deaths/Stringency)')
+    plt.title('Policy Efficiency Comparison Across Income Levels')
+    plt.grid(True, alpha=0.3, axis='y')
+    return _finish(path)
+
+# Low income countries disproportionate impact
+
+
+def plot_poverty_death(country_poverty, path=None):
+    """Extreme poverty rate vs COVID-19 deaths, coloured by GDP per capita"""
+    plt.figure(figsize=(12, 8))
+
+    plt.scatter(country_poverty['extreme_poverty'],
+                country_poverty['total_deaths_per_million'],
+                alpha=0.7, s=50, c=country_poverty['gdp_per_capita'], cmap='viridis')
+    plt.colorbar(label='GDP per capita (USD)')
+
+    plt.xlabel('Extreme Poverty Rate (%)')
+    plt.ylabel('COVID-19 Deaths per Million')
+    plt.title('Relationship between Extreme Poverty and COVID-19 Mortality')
+    plt.grid(True, alpha=0.3)
+    return _finish(path)
+
+
+def plot_poverty_mortality_correlation(country_poverty, path=None):
+    """Extreme poverty rate vs COVID-19 deaths with a regression line"""
+    plt.figure(figsize=(12, 8))
+    sns.regplot(x='extreme_poverty', y='total_deaths_per_million', data=country_poverty,
+                scatter_kws={'alpha': 0.7})
+    plt.xlabel('Extreme Poverty Rate (%)')
+    plt.ylabel('COVID-19 Deaths per Million')
+    plt.title('Correlation between Extreme Poverty and COVID-19 Mortality Rate')
+    plt.grid(True, alpha=0.3)
+    return _finish(path)
+
+
+def plot_poverty_death_heatmap(heatmap_data, path=None):
+    """Mean deaths per million by GDP group x poverty group"""
+    plt.figure(figsize=(10, 8))
+    sns.heatmap(heatmap_data, annot=True, fmt='.0f', cmap='YlOrRd')
+    plt.title('COVID-19 Mortality Rate by Income and Poverty Level')
+    return _finish(path)
+
+# Batch rendering
+
+
+def _drawing_environment():
+    """Report rcParams and plotting library versions a figure is drawn with"""
+    import matplotlib
+    import numpy as np
+
+    with plt.rc_context():
+        apply_report_style()
+        rc = sorted((key, repr(value)) for key, value in plt.rcParams.items() if key != 'backend')
+    versions = [module.__version__ for module in (matplotlib, sns, pd, np)]
+    return repr((rc, versions))
+
+
+def figure_fingerprint(plot, data, kwargs=None):
+    """Hash a figure's input data, drawing code (with callees), style, library versions and parameters"""
+    digest = hashlib.sha1(content_hash(data).encode())
+    for source in code_sources(plot):
+        digest.update(source.encode())
+    digest.update(_drawing_environment().encode())
+    digest.update(content_hash(kwargs or {}).encode())
+    return digest.hexdigest()
+
+
+def read_figure_fingerprint(path):
+    """Fingerprint stored in an existing PNG, or None"""
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            return image.text.get(FINGERPRINT_KEY)
+    except (OSError, AttributeError):
+        return None
+
+
+def save_figure_atomic(fig, path, fingerprint=None):
+    """Save fig to path via a temporary file, so readers never see a partial image"""
+    directory, file_name = os.path.split(path)
+    tmp_path = os.path.join(directory, f'.{file_name}.tmp')
+    file_format = os.path.splitext(file_name)[1][1:] or 'png'
+    metadata = {FINGERPRINT_KEY: fingerprint} if fingerprint and file_format == 'png' else None
+    fig.savefig(tmp_path, format=file_format, metadata=metadata)
+    os.replace(tmp_path, path)
+
+
+def _render_job(plot, data, path, kwargs=None, fingerprint=None):
+    """Draw one figure with the Agg backend and the report style and save it (never raises)"""
+    plt.switch_backend('Agg')
+    start = time.perf_counter()
+    try:
+        with plt.rc_context():
+            apply_report_style()
+            save_figure_atomic(plot(data, **(kwargs or {})), path, fingerprint)
+        error = None
+    except Exception as exc:
+        error = f"{type(exc).__name__}: {exc}"
+    finally:
+        plt.close('all')
+    return {'figure': plot.__name__, 'path': path, 'status': 'rendered',
+            'seconds': time.perf_counter() - start, 'error': error}
+
+
+def render_figures(jobs, figure_dir=FIGURE_DIR, max_workers=None, force=False):
+    """
+    Render a batch of figures in a process pool
+
+    Every PNG carries a fingerprint of its input data, drawing code, style,
+    library versions and parameters (see figure_fingerprint); a figure
+    whose existing file has the same fingerprint is skipped. A failing
+    figure does not abort the batch; its row in the report carries the
+    error message.
+
+    The pool is used by covid_analysis_pipeline (whose entry point is
+    guarded by __main__). The socioeconomic script runs unguarded notebook
+    code, so it renders each figure serially with render_figure instead.
+
+    Parameters:
+    jobs : list - (plot function, data, file name[, kwargs]) tuples; each
+                  plot function takes the data (and kwargs) and returns
+                  the figure
+    figure_dir : str - Output directory, default is 'ca/images'
+    max_workers : int - Worker processes (None = CPU count, 1 = run in-process)
+    force : bool - Re-render every figure regardless of fingerprints
+
+    Returns:
+    DataFrame - One row per figure with FIGURE_REPORT_COLUMNS
+    """
+    os.makedirs(figure_dir, exist_ok=True)
+    results, tasks = {}, {}
+    for i, (plot, data, file_name, *rest) in enumerate(jobs):
+        kwargs = rest[0] if rest else None
+        path = os.path.join(figure_dir, file_name)
+        fingerprint = figure_fingerprint(plot, data, kwargs)
+        if not force and read_figure_fingerprint(path) == fingerprint:
+            results[i] = {'figure': plot.__name__, 'path': path, 'status': 'skipped',
+                          'seconds': 0.0, 'error': None}
+        else:
+            tasks[i] = (plot, data, path, kwargs, fingerprint)
+
+    if max_workers == 1 or len(tasks) <= 1:
+        backend = plt.get_backend()
+        for i, task in tasks.items():
+            results[i] = _render_job(*task)
+        plt.switch_backend(backend)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {i: executor.submit(_render_job, *task) for i, task in tasks.items()}
+            for i, future in futures.items():
+                results[i] = future.result()
+
+    return pd.DataFrame([results[i] for i in sorted(results)], columns=FIGURE_REPORT_COLUMNS)
+
+
+def render_figure(plot, data, file_name, figure_dir=FIGURE_DIR, force=False, **kwargs):
+    """
+    Render one figure in-process through render_figures
+
+    The file is saved atomically with its fingerprint (and skipped when
+    unchanged), as in a batch; a failure is raised instead of reported.
+
+    Returns:
+    str - Path of the figure
+    """
+    report = render_figures([(plot, data, file_name, kwargs)], figure_dir, max_workers=1, force=force)
+    if report['error'].notna().any():
+        raise RuntimeError(f"{plot.__name__} failed: {report['error'].iloc[0]}")
+    return report['path'].iloc[0]
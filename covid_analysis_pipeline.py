@@ -0,0 +1,334 @@
+"""Socioeconomic COVID-19 analysis as a cached dependency graph of stages
+
+Run with: python covid_analysis_pipeline.py [stage ...]
+"""
+import hashlib
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+from covid_analysis_utils import code_sources, content_hash, file_fingerprint
+
+PIPELINE_CACHE_DIR = '.pipeline_cache'
+
+# Generic DAG runner
+
+
+def _code_hash(funcs):
+    """Hash the source of the given callables and of the repo code they call (see code_sources)"""
+    digest = hashlib.sha1()
+    for func in funcs:
+        for source in code_sources(func):
+            digest.update(source.encode())
+    return digest.hexdigest()
+
+
+class Stage:
+    """One named step of a Pipeline (see Pipeline.stage)"""
+
+    def __init__(self, name, func, deps=(), params=None, inputs=(), outputs=(), code=()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.params = params or {}
+        self.inputs = inputs
+        self.outputs = outputs
+        self.code = (func,) + tuple(code)
+
+    def input_files(self):
+        """Source files whose changes invalidate this stage"""
+        return list(self.inputs() if callable(self.inputs) else self.inputs)
+
+    def key(self, dep_hashes):
+        """Cache key from the stage code (with its callees), parameters, input files and dependency outputs"""
+        payload = {
+            'code': _code_hash(self.code),
+            'params': repr(sorted(self.params.items())),
+            'inputs': [(path, file_fingerprint(path)) for path in self.input_files()],
+            'deps': [dep_hashes[dep] for dep in self.deps],
+        }
+        return hashlib.sha1(json.dumps(payload).encode()).hexdigest()[:16]
+
+
+class Pipeline:
+    """
+    Dependency graph of named stages with content-hashed, on-disk caching
+
+    A stage's cache key combines its source code and that of the repo
+    functions it calls (transitively), parameters, input file fingerprints and the content hashes of its dependencies' outputs. A
+    rerun loads every stage whose key is unchanged from disk (lazily, only
+    if a downstream stage actually has to run) and recomputes the rest. A
+    recomputed stage that produces identical output does not invalidate
+    its dependents.
+
+    Parameters:
+    cache_dir : str - Directory for pickled stage outputs
+    """
+
+    def __init__(self, cache_dir=PIPELINE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.stages = {}
+
+    def stage(self, name=None, deps=(), params=None, inputs=(), outputs=(), code=()):
+        """
+        Decorator registering a stage
+
+        Parameters:
+        name : str - Stage name (default: function name)
+        deps : tuple - Names of upstream stages; their outputs are passed
+                       as positional arguments, in this order
+        params : dict - Keyword arguments for the stage function
+        inputs : list or callable - Source files read by the stage
+        outputs : list - Files written by the stage; a cached result is
+                         only reused while all of them exist
+        code : tuple - Extra callables whose source is part of the key (the
+                       repo functions the stage calls are found automatically)
+        """
+        def register(func):
+            stage_name = name or func.__name__
+            self.stages[stage_name] = Stage(stage_name, func, deps, params, inputs, outputs, code)
+            return func
+        return register
+
+    def _order(self, targets):
+        """Topological order of the stages needed for targets"""
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Cycle in pipeline at stage '{name}'")
+            if name not in self.stages:
+                raise KeyError(f"Unknown stage '{name}'")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for target in targets:
+            visit(target)
+        return order
+
+    def _paths(self, name, key):
+        base = os.path.join(self.cache_dir, f'{name}.{key}')
+        return base + '.pkl', base + '.json'
+
+    def _save(self, name, key, output, output_hash):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        result_path, meta_path = self._paths(name, key)
+        pd.to_pickle(output, result_path + '.tmp')
+        os.replace(result_path + '.tmp', result_path)
+        with open(meta_path, 'w') as f:
+            json.dump({'output_hash': output_hash}, f)
+        # Remove outputs of older versions of this stage
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.startswith(name + '.') and key not in file_name and file_name.count('.') == 2:
+                os.remove(os.path.join(self.cache_dir, file_name))
+
+    def run(self, targets=None, force=(), verbose=True):
+        """
+        Run the stages needed for targets, reusing cached outputs
+
+        Parameters:
+        targets : list - Stage names to produce (default: all stages)
+        force : iterable - Stage names to recompute regardless of the cache
+        verbose : bool - Print one line per stage
+
+        Returns:
+        dict - Stage name -> output, for the targets
+        """
+        targets = list(targets or self.stages)
+        order = self._order(targets)
+
+        hashes, keys, outputs, report = {}, {}, {}, []
+
+        def output_of(name):
+            if name not in outputs:
+                outputs[name] = pd.read_pickle(self._paths(name, keys[name])[0])
+            return outputs[name]
+
+        for name in order:
+            stage = self.stages[name]
+            keys[name] = stage.key(hashes)
+            result_path, meta_path = self._paths(name, keys[name])
+            cached = (name not in force and os.path.exists(result_path) and os.path.exists(meta_path)
+                      and all(os.path.exists(path) for path in stage.outputs))
+
+            start = time.perf_counter()
+            if cached:
+                with open(meta_path) as f:
+                    hashes[name] = json.load(f)['output_hash']
+                status = 'cached'
+            else:
+                output = stage.func(*[output_of(dep) for dep in stage.deps], **stage.params)
+                hashes[name] = content_hash(output)
+                self._save(name, keys[name], output, hashes[name])
+                outputs[name] = output
+                status = 'ran'
+            elapsed = time.perf_counter() - start
+            report.append({'stage': name, 'status': status, 'seconds': round(elapsed, 3)})
+            if verbose:
+                print(f"[{status:>6}] {name} ({elapsed:.2f}s)")
+
+        self.last_report = pd.DataFrame(report)
+        return {name: output_of(name) for name in targets}
+
+# Socioeconomic analysis stages
+
+
+OWID_FILE = 'owid-covid-data.csv'
+
+pipeline = Pipeline()
+
+
+def _worldbank_files():
+    from process_worldbank_data import WORLDBANK_DIR
+    return sorted(os.path.join(WORLDBANK_DIR, name) for name in os.listdir(WORLDBANK_DIR)
+                  if name.endswith(('.csv', '.zip')))
+
+
+@pipeline.stage(inputs=[OWID_FILE])
+def load():
+    """Load the OWID columns used by the analysis"""
+    from covid_analysis_utils import load_and_preprocess_data, SOCIO_LOAD_KWARGS
+    return load_and_preprocess_data(OWID_FILE, **SOCIO_LOAD_KWARGS)
+
+
+@pipeline.stage(deps=('load',))
+def clean(df):
+    from covid_analysis_utils import clean_data
+    return clean_data(df)
+
+
+@pipeline.stage(deps=('clean',))
+def country_summary(df_clean):
+    """Per-country aggregates for sovereign countries"""
+    from covid_analysis_utils import build_country_summary
+    return build_country_summary(df_clean, countries_only=True)
+
+
+@pipeline.stage(deps=('country_summary',))
+def socio_summary(summary):
+    """Countries that have both GDP and life expectancy data"""
+    has_data = (summary['gdp_per_capita_count'] > 0) & (summary['life_expectancy_count'] > 0)
+    return summary[has_data].reset_index(drop=True)
+
+
+@pipeline.stage(inputs=_worldbank_files)
+def worldbank():
+    from process_worldbank_data import load_worldbank_data
+    return load_worldbank_data(countries_only=True)
+
+
+@pipeline.stage(deps=('clean',), inputs=_worldbank_files)
+def country_index(df_clean):
+    from process_worldbank_data import build_country_index
+    return build_country_index(df_clean[['iso_code', 'location']].drop_duplicates())
+
+
+@pipeline.stage(deps=('socio_summary',))
+def country_mortality(summary):
+    from covid_analysis_utils import build_country_mortality
+    return build_country_mortality(summary)
+
+
+@pipeline.stage(deps=('socio_summary', 'worldbank', 'country_index'))
+def country_impact(summary, gdp_data, index):
+    from covid_analysis_utils import build_country_impact
+    return build_country_impact(summary, gdp_data, index, report=False)
+
+
+@pipeline.stage(deps=('socio_summary',))
+def country_poverty(summary):
+    from covid_analysis_utils import build_country_poverty
+    return build_country_poverty(summary)
+
+
+@pipeline.stage(deps=('country_mortality', 'country_impact', 'country_poverty'))
+def stats(mortality, impact, poverty):
+    """Correlations, regressions and group summaries reported in the text"""
+    from covid_analysis_stats import correlation_table, fit_ols_batch
+    from covid_analysis_utils import MORTALITY_MODEL, POVERTY_MODEL
+
+    results = {}
+    results['correlations'] = pd.concat([
+        correlation_table(mortality, [('life_expectancy', 'total_deaths_per_million')]),
+        correlation_table(impact, [('stringency_index', 'gdp_change_2020')]),
+        correlation_table(poverty, [('extreme_poverty', 'total_deaths_per_million')]),
+    ], ignore_index=True)
+
+    results['regressions'] = pd.concat([
+        fit_ols_batch(mortality, MORTALITY_MODEL),
+        fit_ols_batch(poverty, POVERTY_MODEL),
+    ], ignore_index=True)
+    results['gdp_change_by_income'] = fit_ols_batch(
+        impact, {'gdp_change_2020 ~ stringency': ('gdp_change_2020', ['stringency_index'])},
+        group_col='income_level')
+
+    results['continent_mortality'] = mortality.groupby('continent', observed=True).agg(
+        avg_deaths_per_million=('total_deaths_per_million', 'mean'),
+        avg_life_expectancy=('life_expectancy', 'mean'),
+        country_count=('location', 'count')).reset_index()
+    results['gdp_efficiency'] = impact.groupby('gdp_group', observed=False)['efficiency_ratio'].agg(
+        ['mean', 'median', 'std', 'count']).reset_index()
+    return results
+
+
+def _figure_paths():
+    from covid_analysis_figures import FIGURE_DIR
+    return [os.path.join(FIGURE_DIR, name) for name in FIGURE_FILES]
+
+
+FIGURE_FILES = [
+    'gdp_stringency_relation.png', 'gdp_continent_boxplot.png', 'gdp_trend_by_continent.png',
+    'gdp_per_capita_relation.png', 'gdp_income_level.png', 'gdp_stringency_income.png',
+    'efficiency-gdp.png', 'proverty-death.png', 'poverty_mortality_correlation.png',
+    'proverty-death-heatmap.png',
+]
+
+
+@pipeline.stage(deps=('country_impact', 'country_poverty'), outputs=_figure_paths(),
+                code=(_figure_paths,))
+def figures(impact, poverty):
+    """Render the report figures into ca/images in parallel"""
+    import covid_analysis_figures as figs
+    from covid_analysis_stats import regression_lines
+    from covid_analysis_utils import continent_gdp_trend, poverty_heatmap_data
+
+    continent_trend = continent_gdp_trend(impact)
+    heatmap_data = poverty_heatmap_data(poverty)
+    # Same fit the script reports, passed in the same way so the fingerprints agree
+    income_fits = regression_lines(impact, 'stringency_index', 'gdp_change_2020', 'income_level')
+    plots = [
+        (figs.plot_gdp_stringency_relation, impact),
+        (figs.plot_gdp_continent_boxplot, impact),
+        (figs.plot_gdp_trend_by_continent, continent_trend),
+        (figs.plot_gdp_per_capita_relation, impact),
+        (figs.plot_gdp_income_level, impact),
+        (figs.plot_gdp_stringency_income, impact, {'fits': income_fits}),
+        (figs.plot_efficiency_gdp, impact.dropna(subset=['efficiency_ratio'])),
+        (figs.plot_poverty_death, poverty),
+        (figs.plot_poverty_mortality_correlation, poverty),
+        (figs.plot_poverty_death_heatmap, heatmap_data),
+    ]
+    jobs = [(plot, data, file_name, *kwargs) for (plot, data, *kwargs), file_name in zip(plots, FIGURE_FILES)]
+    report = figs.render_figures(jobs, figs.FIGURE_DIR)
+    print(report.to_string(index=False))
+    failed = report[report['error'].notna()]
+    if len(failed):
+        raise RuntimeError(f"{len(failed)} figure(s) failed: {', '.join(failed['figure'])}")
+    return _figure_paths()
+
+
+if __name__ == '__main__':
+    outputs = pipeline.run(sys.argv[1:] or None)
+    if 'stats' in outputs:
+        for name, value in outputs['stats'].items():
+            print(f"\n{name}:")
+            print(value)
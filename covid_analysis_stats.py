@@ -0,0 +1,631 @@
+"""Vectorized statistics for the country-level COVID-19 analysis"""
+from concurrent.futures import ProcessPoolExecutor
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+CORRELATION_METHODS = ('pearson', 'spearman')
+
+# Correlation
+
+
+def _pearson_from_matrix(values):
+    """Pairwise-complete Pearson r and pair counts for the columns of a 2-D array"""
+    valid = ~np.isnan(values)
+    weights = valid.astype('float64')
+    # Shift by the column means first to keep the sums well conditioned
+    centered = np.where(valid, values - np.nanmean(values, axis=0), 0.0)
+
+    n = weights.T @ weights
+    sums = centered.T @ weights                 # sums[i, j]: sum of column i where i and j are both valid
+    squares = (centered ** 2).T @ weights
+    products = centered.T @ centered
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = products - sums * sums.T / n
+        var = squares - sums ** 2 / n
+        r = cov / np.sqrt(var * var.T)
+    r = np.clip(r, -1.0, 1.0)
+    r[n < 2] = np.nan
+    return r, n
+
+
+def _rank_columns(values):
+    """Average ranks of each column, ignoring NaNs"""
+    return pd.DataFrame(values).rank(method='average').to_numpy(dtype='float64')
+
+
+def _spearman_from_matrix(values):
+    """Pairwise-complete Spearman rho and pair counts for the columns of a 2-D array"""
+    r, n = _pearson_from_matrix(_rank_columns(values))
+
+    # Ranks are only exact for pairs whose columns are missing on the same rows;
+    # re-rank the remaining pairs on their complete rows
+    valid = ~np.isnan(values)
+    mismatch = (valid.T.astype('int64') @ (~valid).astype('int64')) > 0
+    for i, j in zip(*np.nonzero(np.triu(mismatch | mismatch.T, k=1))):
+        complete = valid[:, i] & valid[:, j]
+        if complete.sum() < 2:
+            r[i, j] = r[j, i] = np.nan
+            continue
+        pair_r, _ = _pearson_from_matrix(_rank_columns(values[complete][:, [i, j]]))
+        r[i, j] = r[j, i] = pair_r[0, 1]
+    return r, n
+
+
+def correlation_pvalues(r, n):
+    """Two-sided p-values for correlation coefficients r from n pairs (t-test, n - 2 df)"""
+    r = np.asarray(r, dtype='float64')
+    dof = np.asarray(n, dtype='float64') - 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = r * np.sqrt(dof / ((1 - r) * (1 + r)))
+        p = 2 * stats.t.sf(np.abs(t), dof)
+    return np.where(dof > 0, p, np.nan)
+
+
+def correlation_matrix(df, columns=None, method='pearson'):
+    """
+    Pairwise correlation coefficients, p-values and pair counts in one pass
+
+    Missing values are handled pairwise: each pair of columns uses the
+    rows where both are present, as DataFrame.corr() does.
+
+    Parameters:
+    df : DataFrame - Input data
+    columns : list - Columns to correlate (default: all numeric columns)
+    method : str - 'pearson' or 'spearman'
+
+    Returns:
+    dict - {'r': DataFrame, 'p': DataFrame, 'n': DataFrame}, each columns x columns
+    """
+    if method not in CORRELATION_METHODS:
+        raise ValueError(f"Unknown correlation method '{method}'")
+    if columns is None:
+        columns = df.select_dtypes('number').columns
+    columns = list(columns)
+    values = df[columns].to_numpy(dtype='float64', na_value=np.nan)
+
+    if method == 'pearson':
+        r, n = _pearson_from_matrix(values)
+    else:
+        r, n = _spearman_from_matrix(values)
+    np.fill_diagonal(r, np.where(np.diag(n) >= 2, 1.0, np.nan))
+    p = correlation_pvalues(r, n)
+    np.fill_diagonal(p, 0.0)
+
+    def frame(matrix):
+        return pd.DataFrame(matrix, index=columns, columns=columns)
+
+    return {'r': frame(r), 'p': frame(p), 'n': frame(n.astype('int64'))}
+
+
+def correlation_test(df, x, y, method='pearson'):
+    """Correlation coefficient and two-sided p-value between two columns (pairwise-complete)"""
+    result = correlation_matrix(df, [x, y], method)
+    return result['r'].iloc[0, 1], result['p'].iloc[0, 1]
+
+
+def correlation_table(df, pairs, method='pearson'):
+    """
+    Tidy correlation results for selected (x, y) column pairs
+
+    All columns involved are correlated in a single correlation_matrix call.
+
+    Returns:
+    DataFrame - Columns x, y, r, p, n
+    """
+    columns = list(dict.fromkeys(column for pair in pairs for column in pair))
+    result = correlation_matrix(df, columns, method)
+    return pd.DataFrame([{'x': x, 'y': y, 'r': result['r'].loc[x, y],
+                          'p': result['p'].loc[x, y], 'n': result['n'].loc[x, y]}
+                         for x, y in pairs])
+
+# Bootstrap
+
+BOOTSTRAP_AGGS = ('mean', 'median', 'std', 'var', 'sum', 'count')
+BOOTSTRAP_COLUMNS = ['estimate', 'ci_low', 'ci_high', 'std_error']
+
+
+def _group_agg(agg, keys, values, n_cells):
+    """One aggregate for every (replicate, group) cell from flat cell keys"""
+    valid = ~np.isnan(values)
+    keys, values = keys[valid], values[valid]
+    counts = np.bincount(keys, minlength=n_cells).astype('float64')
+    if agg == 'count':
+        return counts
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if agg == 'median':
+            order = np.lexsort((values, keys))
+            sorted_values = values[order]
+            starts = np.searchsorted(keys[order], np.arange(n_cells))
+            n = counts.astype('int64')
+            lower = np.minimum(starts + (n - 1) // 2, max(len(order) - 1, 0))
+            upper = np.minimum(starts + n // 2, max(len(order) - 1, 0))
+            if not len(order):
+                return np.full(n_cells, np.nan)
+            return np.where(n > 0, (sorted_values[lower] + sorted_values[upper]) / 2, np.nan)
+        # Centre first so the sum of squares does not cancel
+        shift = values.mean() if len(values) else 0.0
+        sums = np.bincount(keys, weights=values - shift, minlength=n_cells)
+        if agg == 'sum':
+            return sums + shift * counts
+        if agg == 'mean':
+            return sums / counts + shift
+        squares = np.bincount(keys, weights=(values - shift) ** 2, minlength=n_cells)
+        var = (squares - sums ** 2 / counts) / (counts - 1)
+        var = np.maximum(var, 0)
+        return var if agg == 'var' else np.sqrt(var)
+
+
+def _groupby_replicates(codes, values, n_groups, aggs, index):
+    """
+    Grouped aggregates for each row of a bootstrap index matrix
+
+    Every (replicate, group) pair becomes one flat bincount cell, so a whole
+    chunk of replicates is aggregated without any groupby.
+
+    Returns:
+    ndarray - Shape (replicates, groups, statistics)
+    """
+    n_reps = len(index)
+    n_cells = n_reps * n_groups
+    keys = (np.arange(n_reps)[:, None] * n_groups + codes[index]).ravel()
+    results = [_group_agg(agg, keys, values[:, j][index].ravel(), n_cells)
+               for j, agg in aggs]
+    return np.stack(results, axis=-1).reshape(n_reps, n_groups, len(aggs))
+
+
+def _correlation_replicates(x, y, method, index):
+    """Correlation of x and y for each row of a bootstrap index matrix"""
+    xs, ys = x[index], y[index]
+    if method == 'spearman':
+        xs = stats.rankdata(xs, axis=1)
+        ys = stats.rankdata(ys, axis=1)
+    xs = xs - xs.mean(axis=1, keepdims=True)
+    ys = ys - ys.mean(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (xs * ys).sum(axis=1) / np.sqrt((xs ** 2).sum(axis=1) * (ys ** 2).sum(axis=1))
+
+
+def _resample_rows(rng, n_rows, size):
+    """size bootstrap resamples (with replacement) of n_rows row indices"""
+    return rng.integers(0, n_rows, size=(size, n_rows))
+
+
+def _permute_labels(rng, labels, size):
+    """size independent permutations of a label vector, one per row"""
+    return rng.permuted(np.tile(labels, (size, 1)), axis=1)
+
+
+def _random_chunk(sampler, sample_arg, func, args, size, seed):
+    """Draw one chunk of random index/label rows and evaluate func on them"""
+    rng = np.random.default_rng(seed)
+    return func(*args, sampler(rng, sample_arg, size))
+
+
+def _run_chunked(sampler, sample_arg, func, args, total, seed, chunk_size, max_workers):
+    """Evaluate func on total sampled rows, chunk by chunk, optionally in a process pool"""
+    sizes = [min(chunk_size, total - start) for start in range(0, total, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(sampler, sample_arg, func, args, size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+
+    if max_workers == 1 or len(tasks) == 1:
+        results = [_random_chunk(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_random_chunk, *task) for task in tasks]
+            results = [future.result() for future in futures]
+    return np.concatenate(results)
+
+
+def run_bootstrap(func, args, n_rows, n_boot=10_000, seed=0, chunk_size=1000, max_workers=1):
+    """
+    Evaluate func(*args, index) on n_boot resampled index matrices
+
+    Replicates are drawn in chunks of chunk_size, each from its own child of
+    a SeedSequence, so results depend on seed but not on max_workers. The
+    default runs in-process; a pool (max_workers > 1 or None) must be
+    started from code under an ``if __name__ == '__main__'`` guard.
+
+    Parameters:
+    func : callable - Takes args and a (replicates, n_rows) index matrix and
+                      returns one row of statistics per replicate
+    args : tuple - Leading arguments for func (must be picklable)
+    n_rows : int - Number of rows to resample
+    n_boot : int - Number of replicates
+    seed : int - Seed for the random generator
+    chunk_size : int - Replicates per chunk
+    max_workers : int - Worker processes (1 = run in-process, None = CPU count)
+
+    Returns:
+    ndarray - Replicate statistics stacked along the first axis
+    """
+    return _run_chunked(_resample_rows, n_rows, func, args, n_boot, seed, chunk_size, max_workers)
+
+
+def _percentile_ci(estimates, replicates, ci):
+    """Percentile interval and standard error along the replicate axis"""
+    alpha = (1 - ci) / 2
+    low, high = np.nanquantile(replicates, [alpha, 1 - alpha], axis=0)
+    return {'estimate': estimates, 'ci_low': low, 'ci_high': high,
+            'std_error': np.nanstd(replicates, axis=0, ddof=1)}
+
+
+def bootstrap_groupby(df, group_col, aggs, n_boot=10_000, ci=0.95, seed=0, chunk_size=1000,
+                      max_workers=1):
+    """
+    Bootstrap confidence intervals for grouped aggregates
+
+    Country rows are resampled with replacement from the whole frame (group
+    sizes vary between replicates, as they would in a new sample).
+
+    Parameters:
+    df : DataFrame - One row per country
+    group_col : str - Grouping column
+    aggs : dict - Column -> aggregate name or list of names, as for
+                  DataFrame.agg (supported: BOOTSTRAP_AGGS)
+    n_boot : int - Number of replicates
+    ci : float - Confidence level of the percentile interval
+    seed, chunk_size, max_workers - See run_bootstrap
+
+    Returns:
+    DataFrame - Columns group_col, column, agg and BOOTSTRAP_COLUMNS
+    """
+    spec = [(column, agg) for column, names in aggs.items()
+            for agg in ([names] if isinstance(names, str) else names)]
+    unknown = {agg for _, agg in spec} - set(BOOTSTRAP_AGGS)
+    if unknown:
+        raise ValueError(f"Unsupported bootstrap aggregates: {sorted(unknown)}")
+
+    data = df[df[group_col].notna()]
+    codes, groups = pd.factorize(data[group_col], sort=True)
+    columns = list(dict.fromkeys(column for column, _ in spec))
+    values = data[columns].to_numpy(dtype='float64', na_value=np.nan)
+    agg_index = [(columns.index(column), agg) for column, agg in spec]
+    args = (codes, values, len(groups), agg_index)
+
+    estimates = _groupby_replicates(*args, np.arange(len(data))[None, :])[0]
+    replicates = run_bootstrap(_groupby_replicates, args, len(data), n_boot, seed, chunk_size, max_workers)
+    result = _percentile_ci(estimates, replicates, ci)
+
+    return pd.DataFrame({
+        group_col: np.repeat(np.asarray(groups), len(spec)),
+        'column': [column for column, _ in spec] * len(groups),
+        'agg': [agg for _, agg in spec] * len(groups),
+        **{name: values.ravel() for name, values in result.items()},
+    })
+
+
+def bootstrap_correlation(df, pairs, method='pearson', n_boot=10_000, ci=0.95, seed=0, chunk_size=1000,
+                          max_workers=1):
+    """
+    Bootstrap confidence intervals for correlations between column pairs
+
+    Each pair resamples its complete rows (as correlation_matrix does).
+
+    Returns:
+    DataFrame - Columns x, y and BOOTSTRAP_COLUMNS
+    """
+    if method not in CORRELATION_METHODS:
+        raise ValueError(f"Unknown correlation method '{method}'")
+    rows = []
+    for x, y in pairs:
+        pair = df[[x, y]].dropna().to_numpy(dtype='float64')
+        args = (pair[:, 0], pair[:, 1], method)
+        estimate = _correlation_replicates(*args, np.arange(len(pair))[None, :])[0]
+        replicates = run_bootstrap(_correlation_replicates, args, len(pair), n_boot, seed, chunk_size,
+                                   max_workers)
+        rows.append({'x': x, 'y': y, **_percentile_ci(estimate, replicates, ci)})
+    return pd.DataFrame(rows, columns=['x', 'y'] + BOOTSTRAP_COLUMNS)
+
+# Permutation tests
+
+PERMUTATION_STATISTICS = ('anova', 'diff_means')
+
+
+def _group_statistics(values, counts, statistic, labels):
+    """
+    ANOVA F or difference in means for each row of a label matrix
+
+    Permuting labels keeps the group sizes and the total sum of squares
+    fixed, so each permutation only needs its per-group sums (one bincount
+    over (permutation, group) cells).
+    """
+    n_perms, n_groups = len(labels), len(counts)
+    keys = (np.arange(n_perms)[:, None] * n_groups + labels).ravel()
+    sums = np.bincount(keys, weights=np.broadcast_to(values, labels.shape).ravel(),
+                       minlength=n_perms * n_groups).reshape(n_perms, n_groups)
+    if statistic == 'diff_means':
+        return sums[:, 0] / counts[0] - sums[:, 1] / counts[1]
+
+    n = counts.sum()
+    total = values.sum()
+    ss_total = ((values - total / n) ** 2).sum()
+    ss_between = (sums ** 2 / counts).sum(axis=1) - total ** 2 / n
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (ss_between / (n_groups - 1)) / ((ss_total - ss_between) / (n - n_groups))
+
+
+def permutation_test(df, group_col, value_col, statistic='anova', groups=None, n_perm=100_000,
+                     seed=0, chunk_size=2000, max_workers=1):
+    """
+    Permutation test for differences between groups
+
+    Group labels are shuffled n_perm times (in seeded chunks, in-process
+    unless max_workers asks for a pool) and the statistic is recomputed
+    from group sums.
+
+    Parameters:
+    df : DataFrame - One row per country
+    group_col : str - Grouping column
+    value_col : str - Outcome column (rows with a missing value are dropped)
+    statistic : str - 'anova' (one-way F over all groups) or 'diff_means'
+                      (mean of groups[0] minus mean of groups[1], two-sided)
+    groups : list - Groups to compare (default: all observed groups; exactly
+                    two are required for 'diff_means')
+    n_perm : int - Number of permutations
+    seed, chunk_size, max_workers - As for run_bootstrap
+
+    Returns:
+    dict - statistic, p_value, n_perm, groups, group_means, group_sizes
+    """
+    if statistic not in PERMUTATION_STATISTICS:
+        raise ValueError(f"Unknown permutation statistic '{statistic}'")
+
+    data = df[[group_col, value_col]].dropna()
+    if groups is not None:
+        data = data[data[group_col].isin(groups)]
+        categories = list(groups)
+    else:
+        categories = list(pd.factorize(data[group_col], sort=True)[1])
+    labels = pd.Categorical(data[group_col], categories=categories).codes.astype('int64')
+    values = data[value_col].to_numpy(dtype='float64')
+    counts = np.bincount(labels, minlength=len(categories)).astype('float64')
+    if statistic == 'diff_means' and len(categories) != 2:
+        raise ValueError("'diff_means' compares exactly two groups")
+    if (counts == 0).any():
+        raise ValueError(f"Empty group(s) in '{group_col}'")
+
+    args = (values, counts, statistic)
+    observed = _group_statistics(*args, labels[None, :])[0]
+    null = _run_chunked(_permute_labels, labels, _group_statistics, args, n_perm, seed,
+                        chunk_size, max_workers)
+
+    # Small tolerance so permutations tying the observed value count as extreme
+    tolerance = 1e-12 * max(abs(observed), 1.0)
+    if statistic == 'diff_means':
+        extreme = (np.abs(null) >= abs(observed) - tolerance).sum()
+    else:
+        extreme = (null >= observed - tolerance).sum()
+
+    return {
+        'statistic': observed,
+        'p_value': (extreme + 1) / (n_perm + 1),
+        'n_perm': n_perm,
+        'groups': categories,
+        'group_means': np.bincount(labels, weights=values) / counts,
+        'group_sizes': counts.astype('int64'),
+    }
+
+# Batch OLS
+
+OLS_COLUMNS = ['model', 'term', 'coef', 'std_error', 't', 'p_value', 'ci_low', 'ci_high',
+               'r_squared', 'adj_r_squared', 'n_obs']
+
+
+def ols_stack(designs, targets, alpha=0.05):
+    """
+    Fit many least-squares problems with one batched QR decomposition
+
+    Problems are zero-padded to a common (rows, terms) shape. Padded rows
+    contribute nothing to the fit; each padded term gets a dummy unit row
+    so it stays identifiable with a coefficient of exactly zero. Columns
+    are scaled to unit norm before the QR step for numerical stability.
+    Rank-deficient problems (some |diag(R)| <= eps * rows * max |diag(R)|,
+    e.g. a constant or collinear predictor) get NaN estimates and a
+    RuntimeWarning instead of arbitrary coefficients.
+
+    Parameters:
+    designs : list - Design matrices (n_i x k_i arrays, constant included)
+    targets : list - Response vectors (n_i arrays)
+    alpha : float - Significance level of the confidence intervals
+
+    Returns:
+    dict - Arrays coef, std_error, t, p_value, ci_low, ci_high (each
+           problems x max terms, NaN-padded), cov (problems x terms x terms),
+           dof, r_squared, adj_r_squared and n_obs (each per problem)
+    """
+    n_problems = len(designs)
+    n_obs = np.array([len(y) for y in targets])
+    n_terms = np.array([X.shape[1] for X in designs])
+    k_max = int(n_terms.max())
+    m = int(n_obs.max()) + k_max
+
+    X = np.zeros((n_problems, m, k_max))
+    y = np.zeros((n_problems, m))
+    for i, (design, target) in enumerate(zip(designs, targets)):
+        X[i, :n_obs[i], :n_terms[i]] = design
+        y[i, :n_obs[i]] = target
+    padded_terms = np.arange(k_max)[None, :] >= n_terms[:, None]
+    problem, term = np.nonzero(padded_terms)
+    X[problem, n_obs.max() + term, term] = 1.0
+
+    scale = np.linalg.norm(X, axis=1)
+    scale[scale == 0] = 1.0
+    q, r = np.linalg.qr(X / scale[:, None, :])
+    r_diag = np.abs(np.diagonal(r, axis1=1, axis2=2))
+    singular = (r_diag <= np.finfo('float64').eps * m * r_diag.max(axis=1, keepdims=True)).any(axis=1)
+    if singular.any():
+        warnings.warn(f"{singular.sum()} of {n_problems} least-squares problems are rank-deficient; "
+                      f"their estimates are NaN", RuntimeWarning, stacklevel=2)
+        # Solve an identity system for those instead (results are masked below)
+        r = np.where(singular[:, None, None], np.eye(k_max), r)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        coef_scaled = np.linalg.solve(r, np.einsum('bmk,bm->bk', q, y)[..., None])[..., 0]
+        r_inv = np.linalg.inv(r)
+    coef = coef_scaled / scale
+
+    residuals = y - np.einsum('bmk,bk->bm', X, coef)
+    valid_rows = np.arange(m)[None, :] < n_obs[:, None]
+    rss = (np.where(valid_rows, residuals, 0) ** 2).sum(axis=1)
+    dof = n_obs - n_terms
+    y_mean = np.array([t.mean() for t in targets])
+    tss = (np.where(valid_rows, y - y_mean[:, None], 0) ** 2).sum(axis=1)
+    # Models without a constant use the uncentered total sum of squares (as statsmodels does)
+    has_constant = np.array([np.any(np.all(design == design[:1], axis=0) & (design[0] != 0))
+                             for design in designs])
+    tss = np.where(has_constant, tss, (np.where(valid_rows, y, 0) ** 2).sum(axis=1))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sigma2 = rss / dof
+        # (R^T R)^-1 = R^-1 R^-T, then undo the column scaling
+        cov = sigma2[:, None, None] * (r_inv @ np.swapaxes(r_inv, 1, 2)) / (scale[:, :, None] * scale[:, None, :])
+        std_error = np.sqrt(np.diagonal(cov, axis1=1, axis2=2))
+        t = coef / std_error
+        p_value = 2 * stats.t.sf(np.abs(t), dof[:, None])
+        critical = stats.t.ppf(1 - alpha / 2, dof)[:, None]
+        r_squared = 1 - rss / tss
+        adj_r_squared = 1 - (1 - r_squared) * (n_obs - has_constant) / dof
+
+    def mask(values):
+        return np.where(padded_terms | singular[:, None], np.nan, values)
+
+    return {
+        'coef': mask(coef), 'std_error': mask(std_error), 't': mask(t), 'p_value': mask(p_value),
+        'ci_low': mask(coef - critical * std_error), 'ci_high': mask(coef + critical * std_error),
+        'cov': np.where(singular[:, None, None], np.nan, cov), 'dof': dof,
+        'r_squared': np.where(singular, np.nan, r_squared),
+        'adj_r_squared': np.where(singular, np.nan, adj_r_squared), 'n_obs': n_obs,
+    }
+
+
+def fit_ols_batch(df, models, group_col=None, add_constant=True, alpha=0.05, full_results=False,
+                  return_fit=False):
+    """
+    Fit several OLS specifications (optionally per subgroup) in one batch
+
+    Each specification uses its own complete rows, as sm.OLS on a dropna'd
+    frame would.
+
+    Parameters:
+    df : DataFrame - Input data
+    models : dict - Model name -> (y column, list of x columns)
+    group_col : str - Also fit every model within each group of this column
+    add_constant : bool - Add an intercept term named 'const'
+    alpha : float - Significance level of the confidence intervals
+    full_results : bool - Also fit each model with statsmodels and return
+                          the results objects (for .summary())
+    return_fit : bool - Also return the raw ols_stack arrays (coef, cov,
+                        dof, ...) with a 'keys' list of (model, group) per
+                        problem, or None if nothing was fitted
+
+    Returns:
+    DataFrame - Tidy OLS_COLUMNS table (plus group_col), one row per term;
+                with full_results and/or return_fit, a tuple of the table,
+                {key: statsmodels results} and the raw fit, in that order
+    """
+    keys, designs, targets, term_names = [], [], [], []
+    for name, (y_col, x_cols) in models.items():
+        x_cols = [x_cols] if isinstance(x_cols, str) else list(x_cols)
+        terms = ['const'] + x_cols if add_constant else x_cols
+        columns = [y_col] + x_cols + ([] if group_col is None else [group_col])
+        data = df[columns].dropna()
+        values = data[[y_col] + x_cols].to_numpy(dtype='float64')
+        if add_constant:
+            values = np.column_stack([values[:, :1], np.ones(len(data)), values[:, 1:]])
+        if group_col is None:
+            splits = [(None, np.arange(len(data)))]
+        else:
+            splits = data.groupby(group_col, observed=True).indices.items()
+        for group, rows in splits:
+            if len(rows) <= len(terms):
+                continue
+            keys.append((name, group))
+            designs.append(values[rows, 1:])
+            targets.append(values[rows, 0])
+            term_names.append(terms)
+
+    columns = OLS_COLUMNS if group_col is None else OLS_COLUMNS[:1] + [group_col] + OLS_COLUMNS[1:]
+    fit = None
+    if not keys:
+        table = pd.DataFrame(columns=columns)
+    else:
+        fit = {**ols_stack(designs, targets, alpha), 'keys': keys}
+        problem = np.repeat(np.arange(len(keys)), [len(terms) for terms in term_names])
+        term_index = np.concatenate([np.arange(len(terms)) for terms in term_names])
+        table = pd.DataFrame({
+            'model': [keys[i][0] for i in problem],
+            group_col: [keys[i][1] for i in problem],
+            'term': np.concatenate(term_names),
+            **{stat: fit[stat][problem, term_index] for stat in
+               ['coef', 'std_error', 't', 'p_value', 'ci_low', 'ci_high']},
+            **{stat: fit[stat][problem] for stat in ['r_squared', 'adj_r_squared', 'n_obs']},
+        }, columns=columns)
+
+    if not (full_results or return_fit):
+        return table
+    output = (table,)
+
+    if full_results:
+        import statsmodels.api as sm
+        results = {}
+        for (name, group), design, target, terms in zip(keys, designs, targets, term_names):
+            exog = pd.DataFrame(design, columns=terms)
+            key = name if group_col is None else (name, group)
+            results[key] = sm.OLS(pd.Series(target, name=models[name][0]), exog).fit()
+        output += (results,)
+    if return_fit:
+        output += (fit,)
+    return output
+
+
+def regression_lines(df, x_col, y_col, group_col, n_points=100, ci=0.95):
+    """
+    Simple linear fit with an analytical confidence band for every group
+
+    All groups are fitted in one fit_ols_batch call; the band is the t-interval
+    of the fitted mean, sqrt([1 x] Cov [1 x]^T), evaluated on a grid over
+    each group's x range (what sns.regplot bootstraps per group).
+
+    Parameters:
+    df : DataFrame - Input data
+    x_col, y_col : str - Predictor and response columns
+    group_col : str - One line per group of this column
+    n_points : int - Grid points per line
+    ci : float - Confidence level of the band
+
+    Returns:
+    dict - 'coefficients': fit_ols_batch-style table (const and slope per
+           group); 'lines': DataFrame with group_col, x, fit, ci_low, ci_high
+    """
+    coefficients, fit = fit_ols_batch(df, {f'{y_col} ~ {x_col}': (y_col, [x_col])},
+                                      group_col=group_col, alpha=1 - ci, return_fit=True)
+    if fit is None:
+        return {'coefficients': coefficients,
+                'lines': pd.DataFrame(columns=[group_col, 'x', 'fit', 'ci_low', 'ci_high'])}
+
+    groups = [group for _, group in fit['keys']]
+    data = df[[group_col, x_col, y_col]].dropna()
+    x_range = data.groupby(group_col, observed=True)[x_col].agg(['min', 'max']).loc[groups]
+    lows, highs = x_range['min'].to_numpy(dtype='float64'), x_range['max'].to_numpy(dtype='float64')
+
+    # Grid over each group's own x range: (groups, n_points)
+    grid = lows[:, None] + (highs - lows)[:, None] * np.linspace(0, 1, n_points)[None, :]
+    points = np.stack([np.ones_like(grid), grid], axis=-1)
+
+    fitted = np.einsum('gpk,gk->gp', points, fit['coef'])
+    se_fit = np.sqrt(np.einsum('gpk,gkl,gpl->gp', points, fit['cov'], points))
+    critical = stats.t.ppf(1 - (1 - ci) / 2, fit['dof'])[:, None]
+
+    lines = pd.DataFrame({
+        group_col: np.repeat(np.asarray(groups, dtype=object), n_points),
+        'x': grid.ravel(),
+        'fit': fitted.ravel(),
+        'ci_low': (fitted - critical * se_fit).ravel(),
+        'ci_high': (fitted + critical * se_fit).ravel(),
+    })
+    if isinstance(df[group_col].dtype, pd.CategoricalDtype):
+        lines[group_col] = pd.Categorical(lines[group_col], categories=df[group_col].cat.categories)
+    return {'coefficients': coefficients, 'lines': lines}
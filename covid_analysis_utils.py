@@ -1,3 +1,9 @@
+import hashlib
+import importlib
+import inspect
+import os
+import pickle
+import sys
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -8,6 +14,7 @@ from statsmodels.graphics.gofplots import qqplot
 from statsmodels.tsa.arima.model import ARIMA
 from statsmodels.tsa.statespace.sarimax import SARIMAX
 import warnings
+from covid_analysis_stats import correlation_matrix
 warnings.filterwarnings('ignore')
 
 # Set up Chinese font support
@@ -24,55 +31,617 @@ def setup_chinese_fonts():
     plt.rcParams['font.family'] = ['Noto Sans SC', 'sans-serif']
     plt.rcParams['axes.unicode_minus'] = False  # Fix minus sign display issue
 
+# OWID dataset schema
+
+# Key columns that are always loaded, whatever the caller projects
+OWID_KEY_COLUMNS = ['iso_code', 'continent', 'location', 'date']
+
+# Low-cardinality text columns stored as categoricals
+OWID_CATEGORY_COLUMNS = ['iso_code', 'continent', 'location', 'tests_units']
+
+# Absolute counts keep float64 (world totals exceed float32 precision)
+OWID_COUNT_COLUMNS = [
+    'total_cases', 'new_cases', 'new_cases_smoothed',
+    'total_deaths', 'new_deaths', 'new_deaths_smoothed',
+    'icu_patients', 'hosp_patients',
+    'weekly_icu_admissions', 'weekly_hosp_admissions',
+    'total_tests', 'new_tests', 'new_tests_smoothed',
+    'total_vaccinations', 'people_vaccinated', 'people_fully_vaccinated',
+    'total_boosters', 'new_vaccinations', 'new_vaccinations_smoothed',
+    'new_people_vaccinated_smoothed',
+    'population', 'excess_mortality_cumulative_absolute',
+]
+
+# Normalised metrics (per million/thousand/hundred, rates, indices)
+OWID_FLOAT32_COLUMNS = [
+    'total_cases_per_million', 'new_cases_per_million',
+    'new_cases_smoothed_per_million', 'total_deaths_per_million',
+    'new_deaths_per_million', 'new_deaths_smoothed_per_million',
+    'reproduction_rate', 'icu_patients_per_million',
+    'hosp_patients_per_million', 'weekly_icu_admissions_per_million',
+    'weekly_hosp_admissions_per_million', 'total_tests_per_thousand',
+    'new_tests_per_thousand', 'new_tests_smoothed_per_thousand',
+    'positive_rate', 'tests_per_case',
+    'total_vaccinations_per_hundred', 'people_vaccinated_per_hundred',
+    'people_fully_vaccinated_per_hundred', 'total_boosters_per_hundred',
+    'new_vaccinations_smoothed_per_million',
+    'new_people_vaccinated_smoothed_per_hundred',
+    'stringency_index', 'population_density', 'median_age',
+    'aged_65_older', 'aged_70_older', 'gdp_per_capita', 'extreme_poverty',
+    'cardiovasc_death_rate', 'diabetes_prevalence', 'female_smokers',
+    'male_smokers', 'handwashing_facilities', 'hospital_beds_per_thousand',
+    'life_expectancy', 'human_development_index',
+    'excess_mortality_cumulative', 'excess_mortality',
+    'excess_mortality_cumulative_per_million',
+]
+
+# Columns used by the socioeconomic analysis
+SOCIO_ANALYSIS_COLUMNS = OWID_KEY_COLUMNS + [
+    'total_deaths_per_million', 'stringency_index', 'gdp_per_capita',
+    'extreme_poverty', 'life_expectancy', 'human_development_index',
+]
+
+# load_and_preprocess_data arguments of the socioeconomic analysis; the script and
+# the pipeline both load with these so they compute from the same frame
+SOCIO_LOAD_KWARGS = {'fast': True, 'usecols': SOCIO_ANALYSIS_COLUMNS}
+
+
+def owid_dtypes(columns=None):
+    """Return the explicit OWID dtype mapping (optionally restricted to columns)"""
+    dtypes = {}
+    for col in OWID_CATEGORY_COLUMNS:
+        dtypes[col] = 'category'
+    for col in OWID_COUNT_COLUMNS:
+        dtypes[col] = 'float64'
+    for col in OWID_FLOAT32_COLUMNS:
+        dtypes[col] = 'float32'
+
+    if columns is not None:
+        dtypes = {col: dtype for col, dtype in dtypes.items() if col in columns}
+    return dtypes
+
+
+def _resolve_usecols(usecols):
+    """Merge caller columns with the key columns, keeping order and uniqueness"""
+    if usecols is None:
+        return None
+    return list(dict.fromkeys(OWID_KEY_COLUMNS + list(usecols)))
+
+# Parquet snapshot cache for the OWID CSV
+
+OWID_CACHE_DIR = '.owid_cache'
+
+
+def parquet_available():
+    """Check whether a Parquet engine (pyarrow) is installed"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def file_fingerprint(file_path, full_hash=False):
+    """
+    Fingerprint a source file by size and modification time
+
+    Parameters:
+    file_path : str - File to fingerprint
+    full_hash : bool - Also hash the full file contents (slower, but robust
+                       to tools that preserve mtime)
+
+    Returns:
+    str - Short hex digest identifying this version of the file
+    """
+    stat = os.stat(file_path)
+    digest = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    if full_hash:
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def content_hash(obj):
+    """Hash a value by content (DataFrames/Series by values and dtypes, dicts per item, others by pickle)"""
+    digest = hashlib.sha1()
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        digest.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+        frame = obj if isinstance(obj, pd.DataFrame) else obj.to_frame()
+        digest.update(repr([(str(c), str(t)) for c, t in frame.dtypes.items()]).encode())
+    elif isinstance(obj, dict):
+        for key in sorted(obj, key=str):
+            digest.update(str(key).encode())
+            digest.update(content_hash(obj[key]).encode())
+    else:
+        digest.update(pickle.dumps(obj, protocol=4))
+    return digest.hexdigest()
+
+
+# Directory of this repository's modules (see code_sources)
+_REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _is_repo_module(module):
+    path = getattr(module, '__file__', None)
+    return path is not None and os.path.dirname(os.path.abspath(path)) == _REPO_DIR
+
+
+def _repo_namespaces(func, names):
+    """Globals of func plus the namespaces of the repo modules named in its code"""
+    namespaces = [func.__globals__]
+    for name in names:
+        module = func.__globals__.get(name)
+        if module is None and os.path.exists(os.path.join(_REPO_DIR, name + '.py')):
+            module = importlib.import_module(name)
+        if inspect.ismodule(module) and _is_repo_module(module):
+            namespaces.append(vars(module))
+    return namespaces
+
+
+def code_sources(func):
+    """
+    Source of func and of the repo functions and classes it uses, transitively
+
+    Names are resolved in the function's globals and in the repo modules its
+    code names (so function-local imports and module attributes count).
+    Public upper-case module constants it reads are included by repr. Library code
+    outside the repository is not followed.
+
+    Returns:
+    list - Source strings, in a deterministic order
+    """
+    sources, seen, stack = [], set(), [func]
+    while stack:
+        obj = stack.pop()
+        if obj in seen:
+            continue
+        seen.add(obj)
+        if inspect.isclass(obj):
+            stack.extend(getattr(member, '__func__', member) for member in vars(obj).values()
+                         if inspect.isfunction(getattr(member, '__func__', member)))
+            continue
+        try:
+            sources.append(inspect.getsource(obj))
+        except (OSError, TypeError):
+            sources.append(obj.__code__.co_code.hex())
+
+        codes, names = [obj.__code__], []
+        while codes:
+            code = codes.pop()
+            codes.extend(const for const in code.co_consts if inspect.iscode(const))
+            names.extend(code.co_names)
+        for namespace in _repo_namespaces(obj, dict.fromkeys(names)):
+            for name in dict.fromkeys(names):
+                value = namespace.get(name)
+                if inspect.isfunction(value) or inspect.isclass(value):
+                    if _is_repo_module(sys.modules.get(value.__module__)):
+                        stack.append(value)
+                elif (name.isupper() and not name.startswith('_')
+                      and isinstance(value, (str, int, float, tuple, list, dict))):
+                    sources.append(f'{name} = {value!r}')
+    return sources
+
+
+def load_snapshot(cache_dir, name, key, build, columns=None):
+    """
+    Return the frame snapshotted as name/key, building and saving it on a miss
+
+    Snapshots are Parquet files named '<name>.<key>.parquet'. Writing a new
+    key removes the older snapshots of the same name.
+
+    Parameters:
+    cache_dir : str - Snapshot directory
+    name : str - Snapshot name (e.g. source file stem)
+    key : str - Version key, e.g. from file_fingerprint
+    build : callable - Returns the full DataFrame on a cache miss
+    columns : list - Only return these columns
+
+    Returns:
+    DataFrame - Snapshot contents
+    """
+    snapshot = os.path.join(cache_dir, f"{name}.{key}.parquet")
+    if os.path.exists(snapshot):
+        return pd.read_parquet(snapshot, columns=columns)
+
+    # Cache miss: store every column so the snapshot serves any projection
+    df = build()
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = snapshot + '.tmp'
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, snapshot)
+
+    # Remove snapshots of older versions
+    for file_name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, file_name)
+        if (file_name.startswith(name + '.') and file_name.endswith('.parquet')
+                and file_name.count('.') == name.count('.') + 2 and path != snapshot):
+            os.remove(path)
+
+    if columns is not None:
+        df = df[columns]
+    return df
+
+
+def read_owid_csv(file_path='owid-covid-data.csv', fast=False, usecols=None, engine=None,
+                  cache=True, cache_dir=None, full_hash=False):
+    """
+    Read the raw OWID table, going through a Parquet snapshot when possible
+
+    The first read parses the whole CSV and writes a snapshot keyed by the
+    file's size/mtime (and optionally content hash). Later reads load only
+    the requested columns from the snapshot. A changed CSV gets a new key,
+    and snapshots of older versions are removed.
+
+    Parameters:
+    file_path : str - Path to the OWID CSV file
+    fast : bool - Use the explicit OWID schema (see owid_dtypes)
+    usecols : list - Only return these columns (key columns are always added)
+    engine : str - CSV parser engine used on a cache miss
+    cache : bool - Enable the snapshot cache (ignored without pyarrow)
+    cache_dir : str - Snapshot directory (default: .owid_cache next to the CSV)
+    full_hash : bool - Include a content hash in the cache key
+
+    Returns:
+    DataFrame - Raw OWID data without derived columns
+    """
+    usecols = _resolve_usecols(usecols)
+
+    if not (cache and parquet_available()):
+        return _parse_owid_csv(file_path, fast, usecols, engine)
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), OWID_CACHE_DIR)
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    name = f"{stem}.{'fast' if fast else 'raw'}"
+    key = file_fingerprint(file_path, full_hash=full_hash)
+
+    return load_snapshot(cache_dir, name, key,
+                         lambda: _parse_owid_csv(file_path, fast, None, engine),
+                         columns=usecols)
+
+
+def _parse_owid_csv(file_path, fast, usecols, engine):
+    """Parse the OWID CSV with inferred or schema-pinned dtypes"""
+    if fast:
+        return pd.read_csv(file_path, usecols=usecols, engine=engine,
+                           dtype=owid_dtypes(usecols), parse_dates=['date'])
+    return pd.read_csv(file_path, usecols=usecols, engine=engine)
+
+# Aggregate (non-country) locations
+
+# OWID_* codes that are territories rather than aggregates
+OWID_NON_AGGREGATE_CODES = ('OWID_KOS', 'OWID_CYN')
+
+
+def owid_aggregate_mask(df):
+    """
+    Flag OWID aggregate rows ('World', continents, income groups, ...)
+
+    OWID gives aggregates iso_codes starting with 'OWID_' (a few territories
+    such as Kosovo also use that prefix, see OWID_NON_AGGREGATE_CODES).
+
+    Returns:
+    ndarray - Boolean mask, True for aggregate rows
+    """
+    codes = df['iso_code']
+    if isinstance(codes.dtype, pd.CategoricalDtype):
+        # Test each category once instead of every row
+        categories = codes.cat.categories.to_series()
+        flags = (categories.str.startswith('OWID_') & ~categories.isin(OWID_NON_AGGREGATE_CODES)).to_numpy()
+        cat_codes = codes.cat.codes.to_numpy()
+        return np.where(cat_codes >= 0, flags[cat_codes], False)
+    codes = codes.astype(object)
+    return (codes.str.startswith('OWID_', na=False) & ~codes.isin(OWID_NON_AGGREGATE_CODES)).to_numpy()
+
 # Data loading and preprocessing
 
+# Calendar features that can be derived from the date column
+CALENDAR_FEATURES = ('year', 'month', 'day', 'week', 'quarter')
+
+
+def add_calendar_features(df, features=CALENDAR_FEATURES, date_col='date'):
+    """
+    Add derived calendar columns to df on demand
+
+    Columns that already exist are not recomputed, so repeated calls are
+    cheap. The frame is modified in place and also returned.
+
+    Parameters:
+    df : DataFrame - Data with a datetime (or parseable) date column
+    features : iterable or str - Any of CALENDAR_FEATURES, or 'all'
+    date_col : str - Date column name, default is 'date'
+
+    Returns:
+    DataFrame - df with the requested calendar columns
+    """
+    if features == 'all':
+        features = CALENDAR_FEATURES
+    elif isinstance(features, str):
+        features = [features]
+
+    unknown = set(features) - set(CALENDAR_FEATURES)
+    if unknown:
+        raise ValueError(f"Unknown calendar features: {sorted(unknown)}")
+
+    missing = [feature for feature in features if feature not in df.columns]
+    if not missing:
+        return df
+
+    if not pd.api.types.is_datetime64_any_dtype(df[date_col]):
+        df[date_col] = pd.to_datetime(df[date_col])
+    dates = df[date_col].dt
+    # Calendar parts fit in small integer types unless there are missing dates
+    compact = not df[date_col].isna().any()
+
+    for feature in missing:
+        if feature == 'week':
+            values = dates.isocalendar().week
+        else:
+            values = getattr(dates, feature)
+        if compact:
+            values = values.astype('int16' if feature == 'year' else 'int8')
+        df[feature] = values
+
+    return df
+
+
+def load_and_preprocess_data(file_path='owid-covid-data.csv', fast=False, usecols=None, engine=None,
+                             cache=True, cache_dir=None, features=(), tag_aggregates=True):
+    """
+    Load and preprocess COVID-19 dataset
+
+    Parameters:
+    file_path : str - Path to the OWID CSV file
+    fast : bool - Use the explicit OWID schema (float32 metrics, categorical
+                  keys, parsed dates) instead of letting pandas infer dtypes
+    usecols : list - Only load these columns (key columns are always added)
+    engine : str - CSV parser engine, e.g. 'pyarrow' (default: pandas 'c')
+    cache : bool - Reuse a Parquet snapshot of the CSV (see read_owid_csv)
+    cache_dir : str - Snapshot directory (default: .owid_cache next to the CSV)
+    features : iterable or str - Calendar columns to derive up front, or
+                                 'all'; others can be added later with
+                                 add_calendar_features
+    tag_aggregates : bool - Add a boolean 'is_aggregate' column flagging
+                            OWID aggregate locations (see owid_aggregate_mask)
 
-def load_and_preprocess_data(file_path='owid-covid-data.csv'):
-    """Load and preprocess COVID-19 dataset"""
+    Returns:
+    DataFrame - Loaded dataset with a datetime date column
+    """
     # Read data
-    df = pd.read_csv(file_path)
+    df = read_owid_csv(file_path, fast=fast, usecols=usecols, engine=engine,
+                       cache=cache, cache_dir=cache_dir)
 
     # Convert date column
     df['date'] = pd.to_datetime(df['date'])
-    df['year'] = df['date'].dt.year
-    df['month'] = df['date'].dt.month
-    df['day'] = df['date'].dt.day
-    df['week'] = df['date'].dt.isocalendar().week
-    df['quarter'] = df['date'].dt.quarter
+
+    if tag_aggregates:
+        df['is_aggregate'] = owid_aggregate_mask(df)
+
+    if features:
+        add_calendar_features(df, features)
 
     return df
 
 # Data cleaning functions
 
+# Rows missing any of these are dropped during cleaning
+CLEAN_KEY_COLUMNS = ['location', 'date']
 
-def clean_data(df):
-    """Basic data cleaning"""
-    # Copy dataframe to avoid modifying original data
-    df_clean = df.copy()
 
-    # Check and handle missing values
-    print("Original data shape:", df.shape)
+def _print_missing_report(shape, null_counts):
+    """Print the original shape and per-column missing value percentage"""
+    print("Original data shape:", shape)
     print("Missing value percentage:")
-    missing_percentage = df.isnull().mean() * 100
+    missing_percentage = null_counts / shape[0] * 100
     print(missing_percentage[missing_percentage >
           0].sort_values(ascending=False))
 
+
+def clean_data(df):
+    """Basic data cleaning"""
+    # Check and handle missing values
+    _print_missing_report(df.shape, df.isnull().sum())
+
     # Remove columns that are entirely empty (if any)
-    df_clean = df_clean.dropna(axis=1, how='all')
+    # (dropna returns a new frame, so the original data is not modified)
+    df_clean = df.dropna(axis=1, how='all')
 
     # Remove rows with missing values in key columns (location, date)
-    key_columns = ['location', 'date']
-    df_clean = df_clean.dropna(subset=key_columns)
+    df_clean = df_clean.dropna(subset=CLEAN_KEY_COLUMNS)
 
     print("\nCleaned data shape:", df_clean.shape)
 
     return df_clean
 
+
+def _read_owid_chunks(file_path, chunksize, fast, usecols):
+    """Iterate over the OWID CSV in chunks of chunksize rows"""
+    usecols = _resolve_usecols(usecols)
+    if fast:
+        return pd.read_csv(file_path, usecols=usecols, chunksize=chunksize,
+                           dtype=owid_dtypes(usecols), parse_dates=['date'])
+    return pd.read_csv(file_path, usecols=usecols, chunksize=chunksize)
+
+
+def iter_clean_chunks(file_path='owid-covid-data.csv', chunksize=100_000, fast=False, usecols=None):
+    """
+    Stream the OWID CSV through the clean_data rules, one chunk at a time
+
+    A first pass accumulates the missing-value statistics (printed like
+    clean_data) to find the entirely empty columns; a second pass yields
+    cleaned chunks. Only one chunk is held in memory at a time.
+
+    Parameters:
+    file_path : str - Path to the OWID CSV file
+    chunksize : int - Rows per chunk
+    fast : bool - Use the explicit OWID schema (see owid_dtypes)
+    usecols : list - Only load these columns (key columns are always added)
+
+    Yields:
+    DataFrame - Cleaned chunks, all with the same columns
+    """
+    # Pass 1: missing value statistics
+    n_rows = 0
+    null_counts = None
+    for chunk in _read_owid_chunks(file_path, chunksize, fast, usecols):
+        n_rows += len(chunk)
+        chunk_nulls = chunk.isnull().sum()
+        null_counts = chunk_nulls if null_counts is None else null_counts + chunk_nulls
+
+    if null_counts is None:
+        return
+    _print_missing_report((n_rows, len(null_counts)), null_counts)
+    keep_columns = null_counts.index[null_counts < n_rows].tolist()
+
+    # Pass 2: drop empty columns and rows missing key columns
+    n_clean = 0
+    for chunk in _read_owid_chunks(file_path, chunksize, fast, usecols):
+        chunk = chunk[keep_columns].dropna(subset=CLEAN_KEY_COLUMNS)
+        n_clean += len(chunk)
+        yield chunk
+
+    print("\nCleaned data shape:", (n_clean, len(keep_columns)))
+
+
+def _parquet_chunk_schema(schema):
+    """
+    Widen a schema inferred from the first chunk so later chunks fit it
+
+    Categorical columns get int32 dictionary indices (a later chunk may
+    have more categories) and all-null columns or categories become strings.
+    """
+    import pyarrow as pa
+
+    fields = []
+    for field in schema:
+        if pa.types.is_dictionary(field.type):
+            values = field.type.value_type
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string() if pa.types.is_null(values) else values))
+        elif pa.types.is_null(field.type):
+            field = field.with_type(pa.string())
+        fields.append(field)
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def clean_data_chunked(file_path='owid-covid-data.csv', output_path='owid-covid-data-clean.csv',
+                       chunksize=100_000, fast=False, usecols=None):
+    """
+    Clean the OWID CSV with constant memory and write the result to disk
+
+    Parameters:
+    file_path : str - Path to the OWID CSV file
+    output_path : str - Destination, written as Parquet if it ends with
+                        '.parquet' (requires pyarrow), otherwise as CSV
+    chunksize : int - Rows per chunk
+    fast : bool - Use the explicit OWID schema (see owid_dtypes); always on
+                  for Parquet output
+    usecols : list - Only load these columns (key columns are always added)
+
+    Returns:
+    str - output_path
+    """
+    if output_path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Parquet needs one schema for every chunk, so pin the OWID dtypes
+        # instead of inferring them chunk by chunk
+        chunks = iter_clean_chunks(file_path, chunksize=chunksize, fast=True, usecols=usecols)
+        writer = None
+        try:
+            for chunk in chunks:
+                if writer is None:
+                    schema = _parquet_chunk_schema(pa.Table.from_pandas(chunk, preserve_index=False).schema)
+                    writer = pq.ParquetWriter(output_path, schema)
+                writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        chunks = iter_clean_chunks(file_path, chunksize=chunksize, fast=fast, usecols=usecols)
+        header = True
+        for chunk in chunks:
+            chunk.to_csv(output_path, mode='w' if header else 'a', header=header, index=False)
+            header = False
+
+    return output_path
+
+# Indexed country/continent lookups
+
+
+def _run_offsets(values):
+    """Map each value of a sorted column to its contiguous (start, stop) run"""
+    codes, uniques = pd.factorize(values)
+    if len(codes) == 0:
+        return {}
+    starts = np.concatenate(([0], np.flatnonzero(codes[1:] != codes[:-1]) + 1))
+    stops = np.append(starts[1:], len(codes))
+    run_codes = codes[starts]
+    # Missing values (code -1) are not addressable by name
+    keep = run_codes >= 0
+    run_codes, starts, stops = run_codes[keep], starts[keep], stops[keep]
+    if len(np.unique(run_codes)) != len(run_codes):
+        raise ValueError("Values are not contiguous after sorting")
+    return {uniques[code]: (start, stop) for code, start, stop in zip(run_codes, starts, stops)}
+
+
+class CovidDataIndex:
+    """
+    Dataset prepared for repeated location/continent lookups
+
+    The data is sorted once by continent, location and date, so every
+    location and every continent occupies one contiguous block of rows.
+    Lookups then slice that block instead of scanning the whole frame.
+
+    Parameters:
+    df : DataFrame - Data with 'location', 'continent' and 'date' columns
+    """
+
+    def __init__(self, df):
+        sort_cols = [col for col in ['continent', 'location', 'date'] if col in df.columns]
+        self.data = df.sort_values(sort_cols, kind='stable', na_position='last').reset_index(drop=True)
+        self._location_offsets = _run_offsets(self.data['location'].to_numpy())
+        self._continent_offsets = _run_offsets(self.data['continent'].to_numpy())
+
+    @property
+    def locations(self):
+        """All indexed locations"""
+        return list(self._location_offsets)
+
+    @property
+    def continents(self):
+        """All indexed continents"""
+        return list(self._continent_offsets)
+
+    def _span(self, start, stop, copy):
+        subset = self.data.iloc[start:stop]
+        return subset.copy() if copy else subset
+
+    def country(self, country, copy=True):
+        """Get rows for one country/region (copy=False returns a view, do not modify it)"""
+        return self._span(*self._location_offsets.get(country, (0, 0)), copy)
+
+    def countries(self, countries, copy=True):
+        """Get rows for several countries/regions, in index order"""
+        spans = sorted(self._location_offsets[c] for c in set(countries) if c in self._location_offsets)
+        if len(spans) <= 1:
+            return self._span(*(spans[0] if spans else (0, 0)), copy)
+        # Several blocks: gathering them always produces a new frame
+        positions = np.concatenate([np.arange(start, stop) for start, stop in spans])
+        return self.data.take(positions)
+
+    def continent(self, continent, copy=True):
+        """Get rows for one continent (copy=False returns a view, do not modify it)"""
+        return self._span(*self._continent_offsets.get(continent, (0, 0)), copy)
+
 # Create country/region data subsets
 
 
 def get_country_data(df, country):
     """Get data subset for specified country/region"""
+    if isinstance(df, CovidDataIndex):
+        return df.country(country)
     return df[df['location'] == country].copy()
 
 # Create multi-country/region data subsets
@@ -80,6 +649,8 @@ def get_country_data(df, country):
 
 def get_countries_data(df, countries):
     """Get data subset for multiple countries/regions"""
+    if isinstance(df, CovidDataIndex):
+        return df.countries(countries)
     return df[df['location'].isin(countries)].copy()
 
 # Create continent data subsets
@@ -87,62 +658,319 @@ def get_countries_data(df, countries):
 
 def get_continent_data(df, continent):
     """Get data subset for specified continent"""
+    if isinstance(df, CovidDataIndex):
+        return df.continent(continent)
     return df[df['continent'] == continent].copy()
 
+# Country-level summaries
+
+# Output column -> (source column, aggregation) for build_country_summary
+COUNTRY_SUMMARY_AGGS = {
+    'total_deaths_per_million': ('total_deaths_per_million', 'max'),  # latest cumulative
+    'stringency_index': ('stringency_index', 'mean'),
+    'gdp_per_capita': ('gdp_per_capita', 'first'),
+    'life_expectancy': ('life_expectancy', 'first'),
+    'extreme_poverty': ('extreme_poverty', 'first'),
+    'continent': ('continent', 'first'),
+    'gdp_per_capita_count': ('gdp_per_capita', 'count'),
+    'life_expectancy_count': ('life_expectancy', 'count'),
+    'extreme_poverty_count': ('extreme_poverty', 'count'),
+}
+
+
+def build_country_summary(df, group_col='location', aggs=None, countries_only=False):
+    """
+    Compute all per-country aggregates in a single grouped pass
+
+    Analysis sections select the columns they need from the result instead
+    of running their own groupby over the row-level data.
+
+    Parameters:
+    df : DataFrame - Row-level data
+    group_col : str - Grouping column, default is 'location'
+    aggs : dict - Output column -> (source column, aggregation), default is
+                  COUNTRY_SUMMARY_AGGS; entries whose source column is
+                  missing from df are skipped
+    countries_only : bool - Skip rows flagged by the 'is_aggregate' column
+                            (see load_and_preprocess_data)
+
+    Returns:
+    DataFrame - One row per group, with group_col as a regular column
+    """
+    if aggs is None:
+        aggs = COUNTRY_SUMMARY_AGGS
+    aggs = {name: spec for name, spec in aggs.items() if spec[0] in df.columns}
+
+    # Only carry the columns that are aggregated
+    columns = list(dict.fromkeys([group_col] + [source for source, _ in aggs.values()]))
+    if countries_only:
+        if 'is_aggregate' not in df.columns:
+            raise ValueError("countries_only needs an 'is_aggregate' column (see load_and_preprocess_data)")
+        df = df.loc[~df['is_aggregate'].to_numpy(), columns]
+    else:
+        df = df[columns]
+
+    summary = df.groupby(group_col, observed=True).agg(**aggs)
+    return summary.reset_index()
+
+
+def build_country_mortality(summary):
+    """Cumulative mortality, life expectancy, continent and GDP per country"""
+    mortality = summary[['location', 'total_deaths_per_million', 'life_expectancy',
+                         'continent', 'gdp_per_capita']]
+    return mortality.dropna(subset=['total_deaths_per_million', 'life_expectancy']).reset_index(drop=True)
+
+
+def build_country_impact(summary, gdp_data, country_index, report=True):
+    """
+    Country-level stringency, mortality and GDP change with income groups
+
+    Parameters:
+    summary : DataFrame - build_country_summary output
+    gdp_data : DataFrame - World Bank GDP data (see load_worldbank_data)
+    country_index : CountryKeyIndex - OWID/World Bank country matcher
+                                      (see build_country_index)
+    report : bool - Print the locations left unmatched
+
+    Returns:
+    DataFrame - One row per matched country with gdp_group (income
+                tertiles), income_level (quartiles) and efficiency_ratio
+                (deaths per unit of stringency; NaN where stringency is 0)
+    """
+    impact = summary[['location', 'stringency_index', 'total_deaths_per_million',
+                      'gdp_per_capita', 'continent']]
+    impact = country_index.join(impact, gdp_data, report=report)
+    impact = impact.dropna(subset=['stringency_index', 'total_deaths_per_million', 'gdp_per_capita'])
+    impact = impact.reset_index(drop=True)
+    impact['gdp_group'] = pd.qcut(impact['gdp_per_capita'], 3,
+                                  labels=['Low Income', 'Middle Income', 'High Income'])
+    impact['income_level'] = pd.qcut(impact['gdp_per_capita'], q=4,
+                                     labels=['Low', 'Medium-Low', 'Medium-High', 'High'])
+    # Deaths per unit of stringency (lower = more efficient policy)
+    stringency = impact['stringency_index'].where(impact['stringency_index'] > 0)
+    impact['efficiency_ratio'] = impact['total_deaths_per_million'] / stringency
+    return impact
+
+
+def build_country_poverty(summary):
+    """Country-level extreme poverty and COVID-19 impact with GDP/poverty groups"""
+    poverty = summary[['location', 'extreme_poverty', 'total_deaths_per_million',
+                       'gdp_per_capita', 'continent', 'stringency_index']]
+    poverty = poverty.dropna(subset=['extreme_poverty', 'total_deaths_per_million']).reset_index(drop=True)
+    poverty['gdp_group'] = pd.qcut(poverty['gdp_per_capita'], 3,
+                                   labels=['Low Income', 'Middle Income', 'High Income'])
+    poverty['poverty_group'] = pd.cut(poverty['extreme_poverty'], bins=[0, 5, 20, 100],
+                                      labels=['Low Poverty', 'Medium Poverty', 'High Poverty'])
+    return poverty
+
+
+def continent_gdp_trend(country_impact):
+    """Mean GDP change per year (2020-2022) by continent"""
+    return country_impact.groupby('continent', observed=True)[
+        ['gdp_change_2020', 'gdp_change_2021', 'gdp_change_2022']].mean()
+
+
+def poverty_heatmap_data(country_poverty):
+    """Mean deaths per million by GDP group (rows) and poverty group (columns)"""
+    return country_poverty.pivot_table(index='gdp_group', columns='poverty_group',
+                                       values='total_deaths_per_million', aggfunc='mean', observed=False)
+
+
+# Regression specifications reported in the text (model name -> (y, x columns), see fit_ols_batch)
+MORTALITY_MODEL = {'deaths ~ life_expectancy': ('total_deaths_per_million', ['life_expectancy'])}
+POVERTY_MODEL = {'deaths ~ gdp + poverty + stringency': (
+    'total_deaths_per_million', ['gdp_per_capita', 'extreme_poverty', 'stringency_index'])}
+
 # Data summary functions
 
 
+def default_agg_dict(df, exclude=()):
+    """
+    Build the default aggregation dictionary from column dtype kinds
+
+    Numeric columns (int/unsigned/float kinds, including nullable types)
+    are averaged; everything else (text, categories, dates, booleans)
+    keeps its first value.
+    """
+    return {col: 'mean' if df[col].dtype.kind in 'iuf' else 'first'
+            for col in df.columns if col not in exclude}
+
+
+def _as_datetime(df, date_col):
+    """Return df with date_col as datetime, copying only if a conversion is needed"""
+    if pd.api.types.is_datetime64_any_dtype(df[date_col]):
+        return df
+    return df.assign(**{date_col: pd.to_datetime(df[date_col])})
+
+
+# Period-end aliases renamed in pandas 2.2 ('M' -> 'ME', ...); old spellings fail on pandas 3
+_PERIOD_END_ALIASES = {'M': 'ME', 'Q': 'QE', 'Y': 'YE', 'A': 'YE'}
+
+
+def _resample_freq(freq):
+    """Return freq spelled the way the installed pandas accepts it"""
+    try:
+        pd.tseries.frequencies.to_offset(freq)
+        return freq
+    except ValueError:
+        if freq in _PERIOD_END_ALIASES:
+            return _PERIOD_END_ALIASES[freq]
+        raise
+
+
 def summarize_by_date(df, date_col='date', freq='M', agg_dict=None):
     """
     Summarize data by specified date frequency
 
     Parameters:
-    df : DataFrame - Input dataframe
+    df : DataFrame - Input dataframe (not modified)
     date_col : str - Date column name, default is 'date'
-    freq : str - Resampling frequency ('D' daily, 'W' weekly, 'M' monthly, 'Q' quarterly, 'Y' yearly)
+    freq : str - Resampling frequency ('D' daily, 'W' weekly, 'M' monthly, 'Q' quarterly, 'Y' yearly;
+                 month/quarter/year ends are translated to 'ME'/'QE'/'YE' where required)
     agg_dict : dict - Custom aggregation method dictionary
 
     Returns:
     DataFrame - Data summarized by specified frequency
     """
-    # Ensure date column is datetime type
-    df[date_col] = pd.to_datetime(df[date_col])
+    # Ensure date column is datetime type and set it as index
+    df_temp = _as_datetime(df, date_col).set_index(date_col)
 
-    # Set date as index
-    df_temp = df.set_index(date_col)
-
-    # If no aggregation dictionary provided, auto-generate one
+    # If no aggregation dictionary provided, auto-generate one from dtypes
     if agg_dict is None:
-        agg_dict = {}
-        for column in df_temp.columns:
-            # Get column data type
-            dtype = df_temp[column].dtype
-            dtype_str = str(dtype)  # Convert to string for comparison
-
-            # Choose appropriate aggregation method based on data type
-            if ('int' in dtype_str.lower() or
-                'float' in dtype_str.lower() or
-                    'number' in dtype_str.lower()):  # Numeric data
-                agg_dict[column] = 'mean'  # Take mean for numbers
-            elif dtype_str == 'object' or 'string' in dtype_str.lower():  # Text data
-                agg_dict[column] = 'first'  # Take first value for text
-            elif 'datetime' in dtype_str.lower():  # Date type
-                agg_dict[column] = 'first'  # Take first value for dates
-            else:
-                agg_dict[column] = 'first'  # Default to first value for other types
+        agg_dict = default_agg_dict(df_temp)
 
     # Resample by date frequency and apply specified aggregation methods
-    df_resampled = df_temp.resample(freq).agg(agg_dict)
+    df_resampled = df_temp.resample(_resample_freq(freq)).agg(agg_dict)
 
     return df_resampled.reset_index()
 
+
+def summarize_by_date_grouped(df, group_col='location', date_col='date', freq='M',
+                              agg_dict=None, numeric_only=False):
+    """
+    Summarize every group (e.g. country) by date frequency in one pass
+
+    Equivalent to calling summarize_by_date on each group separately, but
+    all groups are resampled together by a single groupby on
+    (group_col, date period).
+
+    Parameters:
+    df : DataFrame - Input dataframe (not modified)
+    group_col : str - Grouping column, default is 'location'
+    date_col : str - Date column name, default is 'date'
+    freq : str - Resampling frequency (see summarize_by_date)
+    agg_dict : dict - Custom aggregation method dictionary
+    numeric_only : bool - Only aggregate numeric columns, skipping the
+                          'first' pass over text columns
+
+    Returns:
+    DataFrame - One row per group and period
+    """
+    df = _as_datetime(df, date_col)
+
+    if agg_dict is None:
+        agg_dict = default_agg_dict(df, exclude=(group_col, date_col))
+        if numeric_only:
+            agg_dict = {col: how for col, how in agg_dict.items() if how == 'mean'}
+
+    grouped = df.groupby([group_col, pd.Grouper(key=date_col, freq=_resample_freq(freq))],
+                         observed=True, sort=True)
+    return grouped.agg(agg_dict).reset_index()
+
 # Plotting helper functions
 
 
-def plot_time_series(df, x_col, y_col, title, xlabel, ylabel, figsize=(12, 6), color='blue', alpha=0.7):
-    """Plot time series graph"""
+def _as_plot_numbers(x):
+    """Numeric view of plot x values (datetimes as int64 nanoseconds)"""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').view('int64').astype('float64')
+    return x.astype('float64')
+
+
+def _minmax_indices(x, y, n_points):
+    """Indices of the min and max point in each of n_points // 2 equal-width x bins"""
+    n_bins = max(n_points // 2, 1)
+    span = x[-1] - x[0]
+    bins = np.zeros(len(x), dtype='int64') if span <= 0 else \
+        np.minimum(((x - x[0]) / span * n_bins).astype('int64'), n_bins - 1)
+    # Sort by bin, then by value: the first/last row of each bin run is its min/max
+    order = np.lexsort((y, bins))
+    sorted_bins = bins[order]
+    starts = np.flatnonzero(np.r_[True, sorted_bins[1:] != sorted_bins[:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+    return np.unique(np.r_[0, order[starts], order[ends], len(x) - 1])
+
+
+def _lttb_indices(x, y, n_points):
+    """Largest-Triangle-Three-Buckets point selection"""
+    n = len(x)
+    edges = np.linspace(1, n - 1, n_points - 1).astype('int64')
+    selected = np.empty(n_points, dtype='int64')
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_points - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third vertex
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean() if next_end > end else x[-1]
+        next_y = y[end:next_end].mean() if next_end > end else y[-1]
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def decimate_series(x, y, n_points=2000, method='minmax'):
+    """
+    Reduce a series to about n_points vertices that draw the same line
+
+    Points with a missing y are dropped before decimating.
+
+    Parameters:
+    x : array-like - Sorted x values (numbers or datetimes)
+    y : array-like - Values
+    n_points : int - Target number of points (e.g. the plot width in pixels)
+    method : str - 'minmax' keeps the extremes of each x bin (exact
+                   envelope, fully vectorized); 'lttb' keeps the point of
+                   largest triangle area per bucket (smoother lines)
+
+    Returns:
+    tuple - (x, y) arrays of the selected points
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype='float64')
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+    if len(x) <= n_points or n_points < 3:
+        return x, y
+    x_num = _as_plot_numbers(x)
+    if method == 'minmax':
+        index = _minmax_indices(x_num, y, n_points)
+    elif method == 'lttb':
+        index = _lttb_indices(x_num, y, n_points)
+    else:
+        raise ValueError(f"Unknown decimation method '{method}'")
+    return x[index], y[index]
+
+
+def _plot_point_budget(max_points, figsize):
+    """Resolve max_points; 'auto' means one point per horizontal pixel of the figure"""
+    if max_points == 'auto':
+        return int(figsize[0] * plt.rcParams['figure.dpi'])
+    return max_points
+
+
+def plot_time_series(df, x_col, y_col, title, xlabel, ylabel, figsize=(12, 6), color='blue', alpha=0.7,
+                     max_points=None, method='minmax'):
+    """Plot time series graph (decimated to max_points, or 'auto' for the figure width in pixels)"""
     plt.figure(figsize=figsize)
-    plt.plot(df[x_col], df[y_col], color=color, alpha=alpha)
+    x, y = df[x_col], df[y_col]
+    max_points = _plot_point_budget(max_points, figsize)
+    if max_points is not None:
+        x, y = decimate_series(x, y, max_points, method)
+    plt.plot(x, y, color=color, alpha=alpha)
     plt.title(title, fontsize=14)
     plt.xlabel(xlabel)
     plt.ylabel(ylabel)
@@ -150,36 +978,50 @@ def plot_time_series(df, x_col, y_col, title, xlabel, ylabel, figsize=(12, 6), c
     plt.tight_layout()
 
 
-def plot_multi_time_series(df, x_col, y_col, group_col, title, xlabel, ylabel, figsize=(14, 7)):
-    """Plot multiple time series graphs (by group)"""
+def plot_multi_time_series(df, x_col, y_col, group_col, title, xlabel, ylabel, figsize=(14, 7),
+                           max_points=None, method='minmax', legend=True):
+    """Plot multiple time series graphs (by group, each decimated to max_points or 'auto')"""
     plt.figure(figsize=figsize)
+    max_points = _plot_point_budget(max_points, figsize)
 
-    for name, group in df.groupby(group_col):
-        plt.plot(group[x_col], group[y_col],
-                 label=name, linewidth=2, alpha=0.7)
+    for name, group in df.groupby(group_col, observed=True):
+        x, y = group[x_col], group[y_col]
+        if max_points is not None:
+            x, y = decimate_series(x, y, max_points, method)
+        plt.plot(x, y, label=name, linewidth=2, alpha=0.7)
 
     plt.title(title, fontsize=14)
     plt.xlabel(xlabel)
     plt.ylabel(ylabel)
-    plt.legend()
+    if legend:
+        plt.legend()
     plt.grid(True, alpha=0.3)
     plt.tight_layout()
 
 
-def plot_correlation_heatmap(df, columns, title, figsize=(12, 10)):
-    """Plot correlation heatmap"""
-    # Calculate correlation coefficient matrix
-    corr_matrix = df[columns].corr()
+def plot_correlation_heatmap(df, columns, title, figsize=(12, 10), method='pearson', show_significance=False):
+    """Plot correlation heatmap (stars mark p < 0.05 / 0.01 / 0.001 when show_significance)"""
+    # Calculate correlation coefficient and p-value matrices
+    result = correlation_matrix(df, columns, method)
+    corr_matrix = result['r']
 
     # Create mask to only show lower triangle matrix
     mask = np.triu(np.ones_like(corr_matrix, dtype=bool))
 
+    annot, fmt = True, ".2f"
+    if show_significance:
+        stars = np.select([result['p'] < 0.001, result['p'] < 0.01, result['p'] < 0.05],
+                          ['***', '**', '*'], '')
+        annot = np.char.add(np.char.mod('%.2f', corr_matrix.to_numpy()), stars)
+        fmt = ''
+
     # Plot heatmap
     plt.figure(figsize=figsize)
-    sns.heatmap(corr_matrix, mask=mask, annot=True, fmt=".2f", cmap="coolwarm",
+    sns.heatmap(corr_matrix, mask=mask, annot=annot, fmt=fmt, cmap="coolwarm",
                 linewidths=0.5, cbar_kws={"shrink": .8})
     plt.title(title, fontsize=14)
     plt.tight_layout()
+    return result
 
 
 def plot_regression(x, y, title, xlabel, ylabel, figsize=(10, 6)):
@@ -211,10 +1053,19 @@ def plot_regression(x, y, title, xlabel, ylabel, figsize=(10, 6)):
 # Time series prediction models
 
 
-def fit_arima_model(series, order=(1, 1, 1)):
-    """Fit ARIMA model"""
+def fit_arima_model(series, order=(1, 1, 1), start_params=None, **search_kwargs):
+    """
+    Fit ARIMA model (optionally warm-started from start_params)
+
+    order='auto' fixes d with a unit-root test and selects p and q with
+    covid_forecast.search_arima_order first; search_kwargs are passed on.
+    """
+    if order == 'auto':
+        from covid_forecast import search_arima_order
+        order = search_arima_order(series, **search_kwargs)['best_order']
+
     model = ARIMA(series, order=order)
-    result = model.fit()
+    result = model.fit(start_params=start_params)
     return result
 
 
@@ -224,25 +1075,116 @@ def forecast_future(model, steps=30):
     return forecast
 
 
-def plot_frequency_distribution(df, variables, subplots_cols=2, subplots_rows=2):
-    """Plot frequency distribution"""
+# Distribution summaries
+
+
+def _distribution_matrix(source, variables):
+    """float64 matrix of the variables from a DataFrame or an iterable of DataFrame chunks"""
+    if isinstance(source, pd.DataFrame):
+        return source[variables].to_numpy(dtype='float64', na_value=np.nan)
+    # Keep only the projected columns of each chunk (float32 to halve memory)
+    parts = [chunk[variables].to_numpy(dtype='float32', na_value=np.nan) for chunk in source]
+    if not parts:
+        return np.empty((0, len(variables)))
+    return np.concatenate(parts).astype('float64')
+
+
+def _sorted_quantile(sorted_values, n, q):
+    """Linear-interpolated quantile q of the first n values of each sorted column"""
+    position = q * np.maximum(n - 1, 0)
+    lower = np.floor(position).astype('int64')
+    upper = np.minimum(lower + 1, np.maximum(n - 1, 0))
+    cols = np.arange(sorted_values.shape[1])
+    low_values = sorted_values[lower, cols]
+    return low_values + (position - lower) * (sorted_values[upper, cols] - low_values)
+
+
+def summarize_distributions(source, variables, bins=50, quantile=0.95):
+    """
+    Histogram and summary statistics for several columns in one pass
+
+    All columns are sorted together once; quantile cutoffs, medians and
+    bin counts are then read off the sorted columns by position. Values
+    above each column's quantile cutoff are excluded, as in
+    plot_frequency_distribution, and the bins span the smallest to the
+    largest kept value (the range hist would use).
+
+    Parameters:
+    source : DataFrame or iterable - Row-level data, or DataFrame chunks
+                                     (e.g. from pd.read_csv(chunksize=...));
+                                     the projected columns of all chunks are
+                                     collected before summarizing (exact
+                                     quantiles need every value), so this
+                                     is not a streaming summary
+    variables : list - Columns to summarize
+    bins : int - Number of equal-width histogram bins
+    quantile : float - Upper cutoff quantile (1.0 keeps all values)
+
+    Returns:
+    dict - variable -> {'edges', 'counts', 'density', 'cutoff', 'mean',
+           'median', 'count'}
+    """
+    variables = list(variables)
+    # NaNs sort to the end of each column
+    values = np.sort(_distribution_matrix(source, variables), axis=0)
+    if len(values) == 0:
+        values = np.full((1, len(variables)), np.nan)
+    n_valid = (~np.isnan(values)).sum(axis=0)
+
+    cutoffs = _sorted_quantile(values, n_valid, quantile)
+    # Values <= cutoff form a prefix of each sorted column
+    n_kept = np.array([np.searchsorted(values[:n, i], cutoffs[i], side='right')
+                       for i, n in enumerate(n_valid)])
+    medians = _sorted_quantile(values, n_kept, 0.5)
+    lows = values[0]
+    prefix_sums = np.where(np.arange(len(values))[:, None] < n_kept, values, 0).sum(axis=0)
+
+    summary = {}
+    for i, var in enumerate(variables):
+        kept = values[:n_kept[i], i]
+        if n_kept[i] and kept[-1] > lows[i]:
+            edges = np.linspace(lows[i], kept[-1], bins + 1)
+        else:
+            edges = np.linspace(lows[i] - 0.5, lows[i] + 0.5, bins + 1)
+        # Bin boundaries by position in the sorted prefix; the last bin is closed
+        boundaries = np.searchsorted(kept, edges, side='left')
+        boundaries[-1] = n_kept[i]
+        counts = np.diff(boundaries)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            density = counts / (n_kept[i] * np.diff(edges))
+            mean = prefix_sums[i] / n_kept[i]
+        summary[var] = {
+            'edges': edges,
+            'counts': counts,
+            'density': density,
+            'cutoff': cutoffs[i],
+            'mean': mean,
+            'median': medians[i],
+            'count': int(n_kept[i]),
+        }
+    return summary
+
+
+def plot_frequency_distribution(df, variables, subplots_cols=2, subplots_rows=2, summary=None):
+    """Plot frequency distribution (from precomputed summarize_distributions bins when given)"""
+    if summary is None:
+        summary = summarize_distributions(df, variables)
+
     # Create subplots
     fig, axes = plt.subplots(subplots_rows, subplots_cols, figsize=(15, 12))
     axes = axes.ravel()
 
     for idx, var in enumerate(variables):
-        data = df[var].dropna()
-        q95 = np.percentile(data, 95)
-        data = data[data <= q95]
-        
-        # Use more efficient plotting method
-        axes[idx].hist(data, bins=50, density=True, alpha=0.6)
-        
+        dist = summary[var]
+
+        # Draw the precomputed bins
+        axes[idx].hist(dist['edges'][:-1], bins=dist['edges'], weights=dist['density'], alpha=0.6)
+
         # Add basic statistical information
         stats_text = f'data statistics (95% quantile):\n'
-        stats_text += f'mean: {data.mean():.2f}\n'
-        stats_text += f'median: {data.median():.2f}\n'
-        stats_text += f'sample size: {len(data):,}'
+        stats_text += f'mean: {dist["mean"]:.2f}\n'
+        stats_text += f'median: {dist["median"]:.2f}\n'
+        stats_text += f'sample size: {dist["count"]:,}'
         
         axes[idx].text(0.95, 0.95, stats_text,
                     transform=axes[idx].transAxes,
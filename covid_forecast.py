@@ -0,0 +1,403 @@
+"""Batch time series forecasting across OWID locations"""
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.arima.model import ARIMA, ARIMAResults
+from statsmodels.tsa.statespace.sarimax import SARIMAX, SARIMAXResults
+
+from covid_analysis_utils import fit_arima_model, forecast_future
+
+# Columns of the tidy frame returned by forecast_all_countries
+FORECAST_COLUMNS = ['location', 'date', 'step', 'forecast', 'fit_seconds', 'error']
+
+# Series preparation
+
+
+def prepare_series(df, target_col, date_col='date'):
+    """
+    Turn one location's rows into a daily series ready for ARIMA
+
+    Leading/trailing missing values are dropped; gaps inside the series stay
+    as NaN on a regular daily index, which the state space models handle.
+    """
+    series = df.set_index(date_col)[target_col].astype('float64').sort_index()
+    valid = series.dropna()
+    if valid.empty:
+        return valid
+    series = series.loc[valid.index[0]:valid.index[-1]]
+    series = series[~series.index.duplicated()]
+    return series.asfreq('D')
+
+
+def iter_location_series(df, target_col, date_col='date', group_col='location', locations=None):
+    """Yield (location, series) pairs for every location with data"""
+    if locations is not None:
+        df = df[df[group_col].isin(locations)]
+    for location, group in df.groupby(group_col, observed=True, sort=True):
+        yield location, prepare_series(group, target_col, date_col)
+
+# Model fitting
+
+
+def fit_model(series, order=(1, 1, 1), seasonal_order=None, model='arima', start_params=None):
+    """
+    Fit an ARIMA or SARIMAX model
+
+    Parameters:
+    series : Series - Regular-frequency series (see prepare_series)
+    order : tuple - (p, d, q) order
+    seasonal_order : tuple - (P, D, Q, s) seasonal order, optional
+    model : str - 'arima' (statsmodels ARIMA) or 'sarimax' (SARIMAX)
+    start_params : array - Warm-start parameters, optional
+    """
+    if model == 'sarimax':
+        return SARIMAX(series, order=order, seasonal_order=seasonal_order or (0, 0, 0, 0)).fit(
+            start_params=start_params, disp=False)
+    if seasonal_order:
+        return ARIMA(series, order=order, seasonal_order=seasonal_order).fit(start_params=start_params)
+    return fit_arima_model(series, order=order, start_params=start_params)
+
+# Persistent model store
+
+MODEL_STORE_DIR = '.model_cache'
+
+
+def series_hash(series):
+    """Hash a series' index and values"""
+    digest = hashlib.sha1(np.asarray(series.index.asi8).tobytes())
+    digest.update(series.to_numpy(dtype='float64').tobytes())
+    return digest.hexdigest()
+
+
+class ArimaModelStore:
+    """
+    On-disk store of fitted ARIMA/SARIMAX results
+
+    Results are keyed by (location, column, model, order, seasonal order)
+    and remember the hash of the data they were fitted on. fit() then picks
+    the cheapest way to get an up-to-date result:
+
+    - 'hit': same data as the stored fit, load it
+    - 'append': the series extends the stored one, append the new
+      observations to the stored result and re-estimate the parameters
+      warm-started from the stored ones (refit=False only filters the new
+      observations with the stored parameters)
+    - 'warm': the history changed, refit from the stored parameters
+    - 'fit': nothing stored, fit from scratch
+
+    Parameters:
+    store_dir : str - Directory for the pickled results
+    refit : bool - Re-estimate parameters when appending new observations
+    """
+
+    def __init__(self, store_dir=MODEL_STORE_DIR, refit=True):
+        self.store_dir = store_dir
+        self.refit = refit
+        self.stats = Counter()
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _paths(self, location, column, model, order, seasonal_order):
+        key = json.dumps([str(location), column, model, list(order),
+                          list(seasonal_order) if seasonal_order else None])
+        name = hashlib.sha1(key.encode()).hexdigest()[:16]
+        base = os.path.join(self.store_dir, name)
+        return base + '.pkl', base + '.json'
+
+    def _load(self, location, column, model, order, seasonal_order):
+        result_path, meta_path = self._paths(location, column, model, order, seasonal_order)
+        if not (os.path.exists(result_path) and os.path.exists(meta_path)):
+            return None, None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        results_class = SARIMAXResults if model == 'sarimax' else ARIMAResults
+        return results_class.load(result_path), meta
+
+    def _save(self, result, series, location, column, model, order, seasonal_order):
+        result_path, meta_path = self._paths(location, column, model, order, seasonal_order)
+        result.save(result_path + '.tmp')
+        os.replace(result_path + '.tmp', result_path)
+        meta = {'data_hash': series_hash(series), 'n_obs': len(series)}
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+
+    def fit(self, series, location, column, order=(1, 1, 1), seasonal_order=None, model='arima'):
+        """
+        Return a fitted result for series, reusing stored work where possible
+
+        Parameters:
+        series : Series - Regular-frequency series (see prepare_series)
+        location : str - Location the series belongs to
+        column : str - Name of the forecast column
+        order : tuple - (p, d, q) order
+        seasonal_order : tuple - (P, D, Q, s) seasonal order, optional
+        model : str - 'arima' or 'sarimax'
+
+        Returns:
+        Fitted statsmodels results object
+        """
+        if isinstance(order, str):
+            # Stored parameters only warm-start a model of the same order
+            raise ValueError(f"ArimaModelStore needs an explicit order, got '{order}' "
+                             "(resolve it with search_arima_order first)")
+        previous, meta = self._load(location, column, model, order, seasonal_order)
+        action = 'fit'
+        result = None
+
+        if previous is not None:
+            n_prev = meta['n_obs']
+            if len(series) == n_prev and series_hash(series) == meta['data_hash']:
+                self.stats['hit'] += 1
+                return previous
+            if len(series) > n_prev and series_hash(series.iloc[:n_prev]) == meta['data_hash']:
+                action = 'append'
+                result = previous.append(series.iloc[n_prev:], refit=self.refit)
+            else:
+                action = 'warm'
+
+        if result is None:
+            start_params = previous.params.to_numpy() if previous is not None else None
+            result = fit_model(series, order, seasonal_order, model, start_params)
+
+        self._save(result, series, location, column, model, order, seasonal_order)
+        self.stats[action] += 1
+        return result
+
+# Automatic order selection
+
+# Evaluated candidates: (data hash, model, order, seasonal order) -> metrics
+_ORDER_SEARCH_CACHE = {}
+
+
+def _evaluate_order(series, order, seasonal_order, model):
+    """Fit one candidate order and return its information criteria (never raises)"""
+    start = time.perf_counter()
+    try:
+        result = fit_model(series, order, seasonal_order, model)
+        return {'aic': result.aic, 'bic': result.bic, 'error': None,
+                'fit_seconds': time.perf_counter() - start}
+    except Exception as exc:
+        return {'aic': np.inf, 'bic': np.inf, 'error': f"{type(exc).__name__}: {exc}",
+                'fit_seconds': time.perf_counter() - start}
+
+
+def select_differencing(series, max_d=2, alpha=0.05):
+    """
+    Choose the differencing order d with repeated augmented Dickey-Fuller tests
+
+    The series is differenced until the ADF test rejects a unit root at
+    level alpha, or max_d is reached.
+    """
+    from statsmodels.tsa.stattools import adfuller
+
+    values = series.dropna()
+    for d in range(max_d):
+        if len(values) < 10 or adfuller(values, autolag='AIC')[1] < alpha:
+            return d
+        values = values.diff().dropna()
+    return max_d
+
+
+def search_arima_order(series, p_values=range(0, 3), d=None, q_values=range(0, 3),
+                       seasonal_orders=(None,), model='arima', criterion='aic',
+                       max_workers=1, patience=1, cache=None, verbose=True, max_d=2):
+    """
+    Search p, q and optional seasonal orders by AIC/BIC for a fixed d
+
+    Likelihoods of models with different differencing orders are computed
+    on differently differenced data and cannot be ranked against each
+    other, so d is fixed first (given by the caller, or chosen with
+    select_differencing) and only the AR/MA terms are searched. For the
+    same reason all seasonal candidates must share one seasonal D.
+
+    Candidates are evaluated level by level, in order of increasing number
+    of AR/MA terms, with each level's fits running in parallel. The search
+    stops early once `patience` consecutive levels fail to improve the best
+    criterion. Evaluated candidates are cached per series, so repeated or
+    overlapping searches only fit new candidates.
+
+    Parameters:
+    series : Series - Regular-frequency series (see prepare_series)
+    p_values, q_values : iterable - Candidate p and q values
+    d : int - Differencing order (None = select_differencing(series, max_d))
+    seasonal_orders : iterable - Candidate (P, D, Q, s) tuples with a common
+                                 D; None means no seasonal component
+    model : str - 'arima' or 'sarimax'
+    criterion : str - 'aic' or 'bic'
+    max_workers : int - Worker processes (1 = run in-process, None = CPU count;
+                        a pool must be started under an __main__ guard)
+    patience : int - Non-improving levels tolerated before stopping
+    cache : dict - Candidate cache (default: module-level cache)
+    verbose : bool - Print the search time and fits per second
+    max_d : int - Largest d considered when d is None
+
+    Returns:
+    dict - best_order, best_seasonal_order, best_score, d, table (DataFrame
+           of evaluated candidates), total_seconds, n_fits, fits_per_second
+    """
+    if criterion not in ('aic', 'bic'):
+        raise ValueError("criterion must be 'aic' or 'bic'")
+    if cache is None:
+        cache = _ORDER_SEARCH_CACHE
+
+    seasonal_orders = list(seasonal_orders)
+    if len({seasonal[1] if seasonal else 0 for seasonal in seasonal_orders}) > 1:
+        raise ValueError("seasonal_orders must share one seasonal differencing order D")
+    if d is None:
+        d = select_differencing(series, max_d)
+
+    data_hash = series_hash(series)
+    candidates = [((p, d, q), seasonal)
+                  for p in p_values for q in q_values
+                  for seasonal in seasonal_orders]
+
+    def complexity(candidate):
+        (p, _, q), seasonal = candidate
+        return p + q + (seasonal[0] + seasonal[2] if seasonal else 0)
+
+    levels = {}
+    for candidate in candidates:
+        levels.setdefault(complexity(candidate), []).append(candidate)
+
+    start = time.perf_counter()
+    rows = []
+    n_fits = 0
+    best_score = np.inf
+    stale_levels = 0
+    executor = ProcessPoolExecutor(max_workers=max_workers) if max_workers != 1 else None
+    try:
+        for level in sorted(levels):
+            todo = [c for c in levels[level] if (data_hash, model) + c not in cache]
+            if executor is None:
+                fitted = [_evaluate_order(series, order, seasonal, model) for order, seasonal in todo]
+            else:
+                futures = [executor.submit(_evaluate_order, series, order, seasonal, model)
+                           for order, seasonal in todo]
+                fitted = [future.result() for future in futures]
+            n_fits += len(todo)
+            for candidate, metrics in zip(todo, fitted):
+                cache[(data_hash, model) + candidate] = metrics
+
+            level_best = np.inf
+            for order, seasonal in levels[level]:
+                metrics = cache[(data_hash, model, order, seasonal)]
+                rows.append({'order': order, 'seasonal_order': seasonal,
+                             'cached': (order, seasonal) not in todo, **metrics})
+                level_best = min(level_best, metrics[criterion])
+
+            if level_best < best_score:
+                best_score = level_best
+                stale_levels = 0
+            else:
+                stale_levels += 1
+                if stale_levels >= patience:
+                    break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    total_seconds = time.perf_counter() - start
+    table = pd.DataFrame(rows).sort_values(criterion, kind='stable').reset_index(drop=True)
+    fits_per_second = n_fits / total_seconds if total_seconds > 0 else np.inf
+    if verbose:
+        print(f"Order search: {len(table)} candidates ({n_fits} fitted, "
+              f"{len(table) - n_fits} cached) in {total_seconds:.2f}s "
+              f"({fits_per_second:.1f} fits/s)")
+
+    return {
+        'best_order': table['order'].iloc[0],
+        'best_seasonal_order': table['seasonal_order'].iloc[0],
+        'best_score': table[criterion].iloc[0],
+        'd': d,
+        'table': table,
+        'total_seconds': total_seconds,
+        'n_fits': n_fits,
+        'fits_per_second': fits_per_second,
+    }
+
+# Batch ARIMA fitting
+
+
+def _fit_and_forecast(location, series, order, steps, min_observations,
+                      target_col=None, store_dir=None):
+    """Fit one location and return its forecast rows (never raises)"""
+    start = time.perf_counter()
+    try:
+        n_obs = int(series.notna().sum())
+        if n_obs < min_observations:
+            raise ValueError(f"only {n_obs} observations (< {min_observations})")
+        if store_dir is None:
+            result = fit_arima_model(series, order=order)
+        else:
+            if order == 'auto':
+                # Key the store on the selected order, so warm starts never cross orders
+                order = search_arima_order(series, verbose=False)['best_order']
+            result = ArimaModelStore(store_dir).fit(series, location, target_col, order=order)
+        forecast = forecast_future(result, steps=steps)
+        elapsed = time.perf_counter() - start
+        return pd.DataFrame({
+            'location': location,
+            'date': forecast.index,
+            'step': np.arange(1, len(forecast) + 1),
+            'forecast': forecast.to_numpy(),
+            'fit_seconds': elapsed,
+            'error': None,
+        })
+    except Exception as exc:
+        elapsed = time.perf_counter() - start
+        return pd.DataFrame({
+            'location': [location], 'date': [pd.NaT], 'step': [0],
+            'forecast': [np.nan], 'fit_seconds': [elapsed],
+            'error': [f"{type(exc).__name__}: {exc}"],
+        })
+
+
+def forecast_all_countries(df, target_col, steps=30, order=(1, 1, 1), date_col='date',
+                           group_col='location', locations=None, max_workers=1,
+                           min_observations=30, store_dir=None):
+    """
+    Fit an ARIMA model per location and forecast every series
+
+    Fits run in-process by default; max_workers > 1 (or None) distributes
+    them over a process pool, which must be started under an __main__
+    guard. A failing location does not abort the batch: it gets a single row with a NaN forecast and the error
+    message.
+
+    Parameters:
+    df : DataFrame - Row-level data with group_col, date_col and target_col
+    target_col : str - Column to forecast
+    steps : int - Forecast horizon in days
+    order : tuple - ARIMA (p, d, q) order, or 'auto' to search it per location
+    date_col : str - Date column name, default is 'date'
+    group_col : str - Location column name, default is 'location'
+    locations : list - Only forecast these locations (default: all)
+    max_workers : int - Worker processes (1 = run in-process, None = CPU count)
+    min_observations : int - Skip series with fewer non-null observations
+    store_dir : str - Reuse and update fitted models in this ArimaModelStore
+                      directory, so re-forecasting after a few new days only
+                      appends the new observations
+
+    Returns:
+    DataFrame - Tidy frame with FORECAST_COLUMNS, one row per location and step
+    """
+    jobs = list(iter_location_series(df, target_col, date_col, group_col, locations))
+
+    if max_workers == 1:
+        results = [_fit_and_forecast(location, series, order, steps, min_observations,
+                                     target_col, store_dir)
+                   for location, series in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_fit_and_forecast, location, series, order, steps,
+                                       min_observations, target_col, store_dir)
+                       for location, series in jobs]
+            results = [future.result() for future in futures]
+
+    if not results:
+        return pd.DataFrame(columns=FORECAST_COLUMNS)
+    return pd.concat(results, ignore_index=True)[FORECAST_COLUMNS]
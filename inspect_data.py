@@ -1,7 +1,8 @@
 import pandas as pd
+from covid_analysis_utils import read_owid_csv
 
 # 读取数据
-df = pd.read_csv('owid-covid-data.csv')
+df = read_owid_csv('owid-covid-data.csv')
 
 # 显示数据基本信息
 print("数据形状:", df.shape)
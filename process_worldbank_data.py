@@ -1,53 +1,427 @@
+import hashlib
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from scipy import stats
-
-def load_worldbank_data():
-    """Load and process World Bank GDP data"""
-    # 读取各个GDP指标数据
-    gdp_growth = pd.read_csv('worldbank/API_NY.GDP.MKTP.KD.ZG_DS2_en_csv_v2_76269.csv', skiprows=4)
-    gdp_per_capita = pd.read_csv('worldbank/API_NY.GDP.PCAP.CD_DS2_en_csv_v2_76317.csv', skiprows=4)
-    gdp_per_capita_growth = pd.read_csv('worldbank/API_NY.GDP.PCAP.KD.ZG_DS2_en_csv_v2_76067.csv', skiprows=4)
-    gdp_current = pd.read_csv('worldbank/API_NY.GDP.MKTP.CD_DS2_en_csv_v2_76261.csv', skiprows=4)
-    
-    # 选择需要的列
-    columns = ['Country Code', 'Country Name', '2019', '2020', '2021', '2022']
-    
-    # 重命名数据框
-    gdp_growth = gdp_growth[columns].rename(columns={'2019': 'gdp_growth_2019', '2020': 'gdp_growth_2020', 
-                                                    '2021': 'gdp_growth_2021', '2022': 'gdp_growth_2022'})
-    gdp_per_capita = gdp_per_capita[columns].rename(columns={'2019': 'gdp_per_capita_2019', '2020': 'gdp_per_capita_2020',
-                                                            '2021': 'gdp_per_capita_2021', '2022': 'gdp_per_capita_2022'})
-    gdp_per_capita_growth = gdp_per_capita_growth[columns].rename(columns={'2019': 'gdp_per_capita_growth_2019',
-                                                                         '2020': 'gdp_per_capita_growth_2020',
-                                                                         '2021': 'gdp_per_capita_growth_2021',
-                                                                         '2022': 'gdp_per_capita_growth_2022'})
-    gdp_current = gdp_current[columns].rename(columns={'2019': 'gdp_current_2019', '2020': 'gdp_current_2020',
-                                                     '2021': 'gdp_current_2021', '2022': 'gdp_current_2022'})
-    
-    # 合并所有数据
-    gdp_data = pd.merge(gdp_growth, gdp_per_capita, on=['Country Code', 'Country Name'])
-    gdp_data = pd.merge(gdp_data, gdp_per_capita_growth, on=['Country Code', 'Country Name'])
-    gdp_data = pd.merge(gdp_data, gdp_current, on=['Country Code', 'Country Name'])
-    
+
+from covid_analysis_stats import correlation_test
+from covid_analysis_utils import file_fingerprint, load_snapshot, owid_aggregate_mask, parquet_available
+
+WORLDBANK_DIR = 'worldbank'
+
+# Indicator registry: World Bank indicator code -> short name.
+# Adding an indicator only needs its API_<code>_DS2_*.csv/.zip download in
+# WORLDBANK_DIR and an entry here.
+WORLDBANK_INDICATORS = {
+    'NY.GDP.MKTP.KD.ZG': 'gdp_growth',
+    'NY.GDP.PCAP.CD': 'gdp_per_capita',
+    'NY.GDP.PCAP.KD.ZG': 'gdp_per_capita_growth',
+    'NY.GDP.MKTP.CD': 'gdp_current',
+}
+
+# Indicators used by load_worldbank_data
+GDP_INDICATORS = ['gdp_growth', 'gdp_per_capita', 'gdp_per_capita_growth', 'gdp_current']
+
+WORLDBANK_CACHE_DIR = '.wb_cache'
+
+WORLDBANK_KEY_COLUMNS = ['Country Code', 'Country Name']
+
+# Columns of the long indicator table
+WORLDBANK_LONG_COLUMNS = ['country_code', 'country_name', 'indicator', 'year', 'value']
+
+
+def _indicator_source(data_dir, code, source, member_prefix=''):
+    """
+    Resolve where an indicator is read from
+
+    Returns (path, member): member is the CSV name inside the .zip archive,
+    or None when reading the extracted CSV. member_prefix selects a file
+    shipped alongside the indicator, e.g. 'Metadata_Country_'.
+    """
+    if source not in ('auto', 'zip', 'csv'):
+        raise ValueError("source must be 'auto', 'zip' or 'csv'")
+    prefix = f'API_{code}_DS2'
+    names = sorted(os.listdir(data_dir))
+    zips = [n for n in names if n.startswith(prefix) and n.endswith('.zip')]
+    csvs = [n for n in names if n.startswith(member_prefix + prefix) and n.endswith('.csv')]
+
+    if source == 'zip' or (source == 'auto' and zips):
+        if not zips:
+            raise FileNotFoundError(f"No {prefix}*.zip in {data_dir}")
+        return os.path.join(data_dir, zips[-1]), member_prefix + os.path.splitext(zips[-1])[0] + '.csv'
+    if not csvs:
+        raise FileNotFoundError(f"No {member_prefix}{prefix}*.csv in {data_dir}")
+    return os.path.join(data_dir, csvs[-1]), None
+
+
+def _read_source_csv(path, member, **kwargs):
+    """Read a CSV from disk, or stream it out of a .zip archive when member is given"""
+    if member is None:
+        return pd.read_csv(path, **kwargs)
+    with zipfile.ZipFile(path) as archive, archive.open(member) as f:
+        return pd.read_csv(f, **kwargs)
+
+
+def _read_indicator_long(path, member, name, years=None):
+    """
+    Read one World Bank indicator file as long arrays
+
+    Only the requested year columns are parsed. With a member name the CSV
+    is streamed straight out of the .zip archive at path.
+
+    Returns:
+    dict - country_code, country_name, indicator, year, value arrays
+    """
+    if years is None:
+        usecols = lambda col: col in WORLDBANK_KEY_COLUMNS or col.isdigit()
+    else:
+        wanted = set(WORLDBANK_KEY_COLUMNS) | {str(year) for year in years}
+        usecols = lambda col: col in wanted
+
+    df = _read_source_csv(path, member, skiprows=4, usecols=usecols)
+
+    year_columns = [col for col in df.columns if col.isdigit()]
+    n_countries, n_years = len(df), len(year_columns)
+    return {
+        'country_code': np.repeat(df['Country Code'].to_numpy(), n_years),
+        'country_name': np.repeat(df['Country Name'].to_numpy(), n_years),
+        'indicator': np.full(n_countries * n_years, name, dtype=object),
+        'year': np.tile(np.array(year_columns, dtype='int16'), n_countries),
+        'value': df[year_columns].to_numpy(dtype='float64').ravel(),
+    }
+
+
+def _resolve_indicators(indicators):
+    """Map short names (default: the whole registry) to indicator codes"""
+    codes = {name: code for code, name in WORLDBANK_INDICATORS.items()}
+    if indicators is None:
+        return codes
+    unknown = [name for name in indicators if name not in codes]
+    if unknown:
+        raise KeyError(f"Indicators not in WORLDBANK_INDICATORS: {unknown}")
+    return {name: codes[name] for name in indicators}
+
+
+def _build_long_table(data_dir, source='auto', indicators=None, years=None, max_workers=None):
+    """Parse the indicator files concurrently into one long table"""
+    def read(item):
+        name, code = item
+        path, member = _indicator_source(data_dir, code, source)
+        return _read_indicator_long(path, member, name, years)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        parts = list(executor.map(read, _resolve_indicators(indicators).items()))
+
+    # Categories keep first-appearance order, i.e. the World Bank file order
+    long = {}
+    for col in WORLDBANK_LONG_COLUMNS:
+        values = np.concatenate([part[col] for part in parts])
+        if values.dtype == object:
+            codes, uniques = pd.factorize(values)
+            values = pd.Categorical.from_codes(codes, categories=uniques)
+        long[col] = values
+    return pd.DataFrame(long)
+
+
+def load_worldbank_long(indicators=None, years=None, data_dir=WORLDBANK_DIR, cache=True, source='auto'):
+    """
+    Load World Bank indicators as a long (country, indicator, year, value) table
+
+    Every registered indicator is parsed in one pass per file and stacked
+    into array-backed columns (categorical keys, int16 years, float64
+    values). The table of all indicators (for the requested years) is
+    snapshotted to Parquet under <data_dir>/.wb_cache and rebuilt when a
+    source file, the indicator registry or the years change.
+
+    Parameters:
+    indicators : list - Short names from WORLDBANK_INDICATORS (default: all)
+    years : iterable - Years to keep (default: all)
+    data_dir : str - Directory with the World Bank files
+    cache : bool - Use the Parquet snapshot (ignored without pyarrow)
+    source : str - 'zip' streams the CSVs out of the downloaded .zip
+                   archives, 'csv' reads the extracted copies, 'auto'
+                   prefers the archives when present
+
+    Returns:
+    DataFrame - WORLDBANK_LONG_COLUMNS
+    """
+    if not (cache and parquet_available()):
+        # Without a snapshot, only parse what was asked for
+        return _build_long_table(data_dir, source, indicators, years)
+
+    # The snapshot depends on the source files, the registry (code -> name) and the years kept
+    years = None if years is None else sorted({int(year) for year in years})
+    key = '-'.join(file_fingerprint(_indicator_source(data_dir, code, source)[0])
+                   for code in WORLDBANK_INDICATORS)
+    key += repr((sorted(WORLDBANK_INDICATORS.items()), years))
+    key = hashlib.sha1(key.encode()).hexdigest()[:16]
+    long = load_snapshot(os.path.join(data_dir, WORLDBANK_CACHE_DIR), 'worldbank_long', key,
+                         lambda: _build_long_table(data_dir, source, years=years))
+
+    if indicators is None:
+        return long
+    mask = long['indicator'].isin(list(_resolve_indicators(indicators))).to_numpy()
+    return long[mask].reset_index(drop=True)
+
+
+def pivot_worldbank(long, indicators=None, years=None):
+    """
+    Pivot the long table to one row per country and '<indicator>_<year>' columns
+
+    Rows keep the World Bank file order; columns are grouped by indicator
+    (in the requested order), then by year.
+    """
+    if indicators is None:
+        indicators = list(pd.unique(long['indicator']))
+    if years is None:
+        years = sorted(pd.unique(long['year']))
+    years = [int(year) for year in years]
+
+    country_codes = pd.Categorical(long['country_code'])
+    countries = country_codes.categories
+    names = pd.Series(long['country_name'].to_numpy(), index=country_codes.codes)
+    names = names[~names.index.duplicated()].sort_index()
+
+    col_index = {(name, year): i for i, (name, year) in
+                 enumerate((name, year) for name in indicators for year in years)}
+    col_positions = np.array([col_index.get((name, year), -1) for name, year in
+                              zip(long['indicator'].to_numpy(), long['year'].to_numpy())])
+    keep = col_positions >= 0
+
+    matrix = np.full((len(countries), len(col_index)), np.nan)
+    matrix[country_codes.codes[keep], col_positions[keep]] = long['value'].to_numpy()[keep]
+
+    wide = pd.DataFrame(matrix, columns=[f'{name}_{year}' for name, year in col_index])
+    wide.insert(0, 'Country Name', names.to_numpy().astype(object))
+    wide.insert(0, 'Country Code', np.asarray(countries, dtype=object))
+    return wide
+
+
+def load_worldbank_indicators(indicators=None, years=None, data_dir=WORLDBANK_DIR, cache=True, source='auto'):
+    """
+    Load World Bank indicators as a wide table keyed by Country Code
+
+    Parameters:
+    indicators : list - Short names from WORLDBANK_INDICATORS (default: all)
+    years : iterable - Years to include (default: all)
+    data_dir, cache, source - See load_worldbank_long
+
+    Returns:
+    DataFrame - Country Code, Country Name and '<indicator>_<year>' columns
+    """
+    long = load_worldbank_long(indicators, years, data_dir=data_dir, cache=cache, source=source)
+    return pivot_worldbank(long, indicators, years)
+
+
+def load_worldbank_data(years=range(2019, 2023), gdp_change='growth', data_dir=WORLDBANK_DIR, cache=True,
+                        source='auto', countries_only=False):
+    """
+    Load and process World Bank GDP data
+
+    Parameters:
+    years : iterable - Years to include for every indicator
+    gdp_change : str - How gdp_change_<year> is defined: 'growth' uses the
+                       real GDP growth indicator, 'current' the change in
+                       current-USD GDP relative to the first year
+    data_dir : str - Directory with the World Bank files
+    cache : bool - Use the Parquet snapshot of the indicator table
+    source : str - 'zip', 'csv' or 'auto' (see load_worldbank_long)
+    countries_only : bool - Drop aggregate rows ('World', 'Euro area',
+                            income groups, ...) using the Metadata_Country file
+
+    Returns:
+    DataFrame - Country Code/Name, '<indicator>_<year>' and gdp_change_<year> columns
+    """
+    years = [str(year) for year in years]
+    gdp_data = load_worldbank_indicators(GDP_INDICATORS, years, data_dir=data_dir, cache=cache, source=source)
+    if countries_only:
+        country_codes = worldbank_country_codes(data_dir, source)
+        gdp_data = gdp_data[gdp_data['Country Code'].isin(country_codes)].reset_index(drop=True)
+
     # 计算GDP变化
-    gdp_data['gdp_change_2020'] = (gdp_data['gdp_current_2020'] - gdp_data['gdp_current_2019']) / gdp_data['gdp_current_2019'] * 100
-    gdp_data['gdp_change_2021'] = (gdp_data['gdp_current_2021'] - gdp_data['gdp_current_2019']) / gdp_data['gdp_current_2019'] * 100
-    gdp_data['gdp_change_2022'] = (gdp_data['gdp_current_2022'] - gdp_data['gdp_current_2019']) / gdp_data['gdp_current_2019'] * 100
-    
+    base_year = years[0]
+    for year in years[1:]:
+        if gdp_change == 'growth':
+            gdp_data[f'gdp_change_{year}'] = gdp_data[f'gdp_growth_{year}']
+        elif gdp_change == 'current':
+            base = gdp_data[f'gdp_current_{base_year}']
+            gdp_data[f'gdp_change_{year}'] = (gdp_data[f'gdp_current_{year}'] - base) / base * 100
+        else:
+            raise ValueError("gdp_change must be 'growth' or 'current'")
+
     return gdp_data
 
-def analyze_gdp_impact(gdp_data, country_impact):
+# Country metadata and key resolution
+
+# OWID codes that differ from the World Bank country code
+OWID_CODE_ALIASES = {
+    'OWID_KOS': 'XKX',
+}
+
+
+def load_worldbank_country_metadata(data_dir=WORLDBANK_DIR, source='auto'):
+    """
+    Load the World Bank Metadata_Country table (region and income group)
+
+    Aggregates such as 'World' or 'Euro area' have no Region.
+
+    Returns:
+    DataFrame - Country Code, Region, IncomeGroup, TableName
+    """
+    code = next(iter(WORLDBANK_INDICATORS))
+    path, member = _indicator_source(data_dir, code, source, member_prefix='Metadata_Country_')
+    return _read_source_csv(path, member, encoding='utf-8-sig',
+                            usecols=['Country Code', 'Region', 'IncomeGroup', 'TableName'])
+
+
+def worldbank_country_codes(data_dir=WORLDBANK_DIR, source='auto'):
+    """Codes of actual countries: Metadata_Country rows with a Region (aggregates have none)"""
+    metadata = load_worldbank_country_metadata(data_dir, source)
+    return set(metadata.loc[metadata['Region'].notna(), 'Country Code'])
+
+
+def _normalize_name(names):
+    """Case- and punctuation-insensitive country names for fallback matching"""
+    return pd.Series(names, dtype=object).str.casefold().str.replace(r'[^0-9a-z]', '', regex=True)
+
+
+class CountryKeyIndex:
+    """
+    One integer key per country across OWID and World Bank identifiers
+
+    World Bank countries (Country Code/Name, Metadata region and income
+    group) get the first keys. Each OWID (iso_code, location) pair is
+    resolved to a World Bank key by code (via OWID_CODE_ALIASES), then by
+    normalised name; anything left gets its own OWID-only key. Joins then
+    map both sides to int32 keys and merge on those.
+
+    Parameters:
+    owid_df : DataFrame - OWID data with 'iso_code' and 'location'
+    wb_countries : DataFrame - World Bank 'Country Code' and 'Country Name'
+    metadata : DataFrame - Output of load_worldbank_country_metadata, optional
+    """
+
+    def __init__(self, owid_df, wb_countries, metadata=None):
+        wb = wb_countries[['Country Code', 'Country Name']].drop_duplicates('Country Code')
+        wb = wb.astype(object).reset_index(drop=True)
+        if metadata is not None:
+            wb = wb.merge(metadata[['Country Code', 'Region', 'IncomeGroup']], on='Country Code', how='left')
+        else:
+            wb['Region'] = np.nan
+            wb['IncomeGroup'] = np.nan
+        wb_keys = pd.Series(np.arange(len(wb), dtype='int32'), index=wb['Country Code'])
+        name_keys = pd.Series(wb_keys.to_numpy(), index=_normalize_name(wb['Country Name']).to_numpy())
+        name_keys = name_keys[~name_keys.index.duplicated()]
+
+        owid = owid_df[['iso_code', 'location']].dropna().astype(object).drop_duplicates('location')
+        owid = owid.reset_index(drop=True)
+        by_code = owid['iso_code'].replace(OWID_CODE_ALIASES).map(wb_keys)
+        by_name = pd.Series(_normalize_name(owid['location']).map(name_keys).to_numpy())
+        owid_keys = by_code.fillna(by_name).astype('float64')
+        unresolved = owid_keys.isna().to_numpy()
+        owid_keys[unresolved] = len(wb) + np.arange(unresolved.sum())
+        owid['country_key'] = owid_keys.astype('int32').to_numpy()
+
+        wb = wb.rename(columns={'Country Code': 'country_code', 'Country Name': 'country_name',
+                                'Region': 'region', 'IncomeGroup': 'income_group'})
+        owid_only = pd.DataFrame({'country_key': owid.loc[unresolved, 'country_key'].to_numpy()})
+        countries = pd.concat([wb.assign(country_key=wb_keys.to_numpy()), owid_only], ignore_index=True)
+        countries = countries.merge(owid.drop_duplicates('country_key'), on='country_key', how='left')
+
+        # Aggregates: World Bank rows without a Metadata region, OWID_* groups
+        owid_aggregate = owid_aggregate_mask(countries)
+        if metadata is not None:
+            wb_aggregate = countries['region'].isna().to_numpy()
+            countries['is_aggregate'] = np.where(countries['country_code'].notna(), wb_aggregate, owid_aggregate)
+        else:
+            countries['is_aggregate'] = owid_aggregate
+        self.countries = countries[['country_key', 'country_code', 'country_name', 'region',
+                                    'income_group', 'iso_code', 'location', 'is_aggregate']]
+        self._aggregate_keys = set(countries.loc[countries['is_aggregate'], 'country_key'])
+
+        self._wb_code_keys = wb_keys
+        self._owid_code_keys = pd.Series(owid['country_key'].to_numpy(), index=owid['iso_code'].to_numpy())
+        self._owid_code_keys = self._owid_code_keys[~self._owid_code_keys.index.duplicated()]
+        self._owid_location_keys = pd.Series(owid['country_key'].to_numpy(), index=owid['location'].to_numpy())
+        self.last_report = None
+
+    def owid_keys(self, df):
+        """Country keys for OWID rows (by iso_code, falling back to location); -1 if unknown"""
+        keys = pd.Series(np.nan, index=df.index)
+        if 'iso_code' in df.columns:
+            keys = df['iso_code'].astype(object).map(self._owid_code_keys)
+        if 'location' in df.columns:
+            keys = keys.fillna(df['location'].astype(object).map(self._owid_location_keys))
+        return keys.fillna(-1).astype('int32').to_numpy()
+
+    def worldbank_keys(self, df):
+        """Country keys for World Bank rows (by Country Code); -1 if unknown"""
+        return df['Country Code'].astype(object).map(self._wb_code_keys).fillna(-1).astype('int32').to_numpy()
+
+    def join(self, owid_df, wb_df, how='inner', report=True):
+        """
+        Join OWID rows to World Bank rows on the integer country key
+
+        Rows whose key cannot be resolved (-1) never match each other; they
+        are reported as unmatched and only kept by outer-side joins. The
+        unmatched OWID locations and World Bank country codes (aggregates
+        excluded) are stored in last_report and, with report=True, printed.
+
+        Returns:
+        DataFrame - Merged rows with a country_key column
+        """
+        left = owid_df.assign(country_key=self.owid_keys(owid_df))
+        right = wb_df.assign(country_key=self.worldbank_keys(wb_df))
+        left_known = left['country_key'].to_numpy() >= 0
+        right_known = right['country_key'].to_numpy() >= 0
+        merged = left[left_known].merge(right[right_known], on='country_key', how=how)
+        unknown = ([left[~left_known]] if how in ('left', 'outer') else []) + \
+                  ([right[~right_known]] if how in ('right', 'outer') else [])
+        if any(len(part) for part in unknown):
+            merged = pd.concat([merged] + unknown, ignore_index=True)
+
+        right_keys = set(right.loc[right_known, 'country_key'].to_numpy())
+        left_keys = set(left.loc[left_known, 'country_key'].to_numpy())
+        unmatched_owid = left.loc[~left['country_key'].isin(right_keys), 'location'].astype(object)
+        unmatched_wb = right.loc[~right['country_key'].isin(left_keys | self._aggregate_keys),
+                                 'Country Code'].astype(object)
+        self.last_report = {
+            'matched': len(left_keys & right_keys),
+            'unmatched_owid': sorted(unmatched_owid.dropna().unique()),
+            'unmatched_worldbank': sorted(unmatched_wb.dropna().unique()),
+        }
+        if report:
+            print(f"Country join: {self.last_report['matched']} matched, "
+                  f"{len(self.last_report['unmatched_owid'])} OWID locations and "
+                  f"{len(self.last_report['unmatched_worldbank'])} World Bank countries unmatched")
+            if self.last_report['unmatched_owid']:
+                print("Unmatched OWID locations:", ', '.join(self.last_report['unmatched_owid']))
+        return merged
+
+
+def build_country_index(owid_df, data_dir=WORLDBANK_DIR, source='auto', cache=True):
+    """Build a CountryKeyIndex from OWID data and the World Bank files"""
+    wb_countries = load_worldbank_indicators([GDP_INDICATORS[0]], data_dir=data_dir, cache=cache, source=source)
+    metadata = load_worldbank_country_metadata(data_dir, source)
+    return CountryKeyIndex(owid_df, wb_countries, metadata)
+
+
+def analyze_gdp_impact(gdp_data, country_impact, country_index=None):
     """Analyze GDP impact and create visualizations"""
     # 合并数据
-    merged_data = pd.merge(
-        country_impact,
-        gdp_data,
-        left_on='iso_code',
-        right_on='Country Code'
-    )
+    if country_index is not None:
+        merged_data = country_index.join(country_impact, gdp_data)
+    else:
+        merged_data = pd.merge(
+            country_impact,
+            gdp_data,
+            left_on='iso_code',
+            right_on='Country Code'
+        )
     
     # 创建GDP影响分析图
     plt.figure(figsize=(12, 6))
@@ -59,7 +433,7 @@ def analyze_gdp_impact(gdp_data, country_impact):
     plt.close()
     
     # 计算相关系数
-    corr, p_value = stats.pearsonr(merged_data['stringency_index'], merged_data['gdp_change_2020'])
+    corr, p_value = correlation_test(merged_data, 'stringency_index', 'gdp_change_2020')
     print(f"Correlation between stringency index and GDP change: {corr:.3f} (p={p_value:.3f})")
     
     # 按大洲分组分析
@@ -77,7 +451,7 @@ def analyze_gdp_impact(gdp_data, country_impact):
 
 def main():
     # 加载数据
-    gdp_data = load_worldbank_data()
+    gdp_data = load_worldbank_data(gdp_change='current')
     
     # 假设country_impact已经存在
     # 这里需要从之前的分析中加载country_impact数据